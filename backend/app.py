@@ -2,40 +2,62 @@ from flask import Flask, Blueprint, request, jsonify
 from flask_cors import CORS
 import logging
 import os
+import threading
 from backend_filepro import FileHandler
 from werkzeug.utils import secure_filename, send_file
-from gen_syn import GenModel, generate_judge_eng
+from gen_syn import GenModel
 from syn_database import DataHandler
-import time
+from constants import warm_up
 from db import ChunkDatabase
-from faiss_index import FaissIndex
-from cloud_upload import cloud_routes
+from index_cache import ProjectIndexCache
+from vector_store import VectorStore
+from query_cache import get_query_cache
+from synonym_service import SynonymService
+from term_index import TermIndexes
+from content_cache import ContentCache
+from jobs import JobQueue
 
 app = Flask(__name__)
 CORS(app)  # Allows React frontend to talk to Flask backend
 
-# Create a Blueprint for the routes in this file
-app.register_blueprint(cloud_routes)
+# Extraction workers are spawned processes. When the app runs as a script (python app.py) they import
+# this file as __mp_main__ before they unpickle their work, which only needs backend_filepro: none of the
+# startup below (database, caches, blob store, model) runs there, the routes are only defined.
+if __name__ != "__mp_main__":
+    # Create a Blueprint for the routes in this file
+    from cloud_upload import cloud_routes  # Sets up the blob store, blob cache and its database on import
+    app.register_blueprint(cloud_routes)
 
-logging.basicConfig(level=logging.INFO)
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Get backend folder path
+    logging.basicConfig(level=logging.INFO)
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Get backend folder path
 
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")  # Dynamically set uploads path
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Ensure folder exists
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")  # Dynamically set uploads path
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Ensure folder exists
 
-# Generate judge and engineer information
-judge, eng = generate_judge_eng(syn_number=5)  # Change the number to the user's preference
-    
-# Initialize the synonym generator 
-syn = GenModel('gpt-4o', "You are a Dutch linguist and construction specialist with expertise in industry terminology. Output only five words separated by commas")
-db_handler = DataHandler(os.path.join(os.getcwd(), "data", "syn_db.json"))
+    # Initialize the synonym generator 
+    syn = GenModel('gpt-4o', "You are a Dutch linguist and construction specialist with expertise in industry terminology. Output only five words separated by commas")
+    db_handler = DataHandler(os.path.join(os.getcwd(), "data", "syn_db.json"))
+    synonym_service = SynonymService(lambda keyword: syn.request_synonyms(f'Find 5 dutch synonyms of {keyword}'), db_handler)
+    SYNONYM_MODE = os.getenv("SYNONYM_MODE", "llm")  # Default /get_synonyms mode: "llm", "local" or "hybrid"
+
+    index_cache = ProjectIndexCache()  # Per-project FAISS indexes reused across searches
+    global db 
+    vector_store = VectorStore()  # Per-project memory-mapped vectors, indexes are built from these instead of the BLOBs
+    db = ChunkDatabase(index_cache=index_cache, vector_store=vector_store)  # Initialize the database handler, keeps the index cache and vector store in sync
+
+    term_indexes = TermIndexes(db)  # Per-project vocabulary embeddings for the local synonym modes
 
-global db 
-db = ChunkDatabase()  # Initialize the database handler
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    handler = FileHandler([])  # Initialize the project handler
 
-handler = FileHandler([])  # Initialize the project handler
+    # The embedding model loads on first use. WARM_UP=background (default) loads it on a thread right after
+    # startup so the worker serves requests immediately, "blocking" loads it before, "off" waits for the first use.
+    WARM_UP = os.getenv("WARM_UP", "background")
+    if WARM_UP == "blocking":
+        warm_up()
+    elif WARM_UP == "background":
+        threading.Thread(target=warm_up, name="model-warm-up", daemon=True).start()
 
 @app.route("/upload", methods=["POST"])
 def upload_file():
@@ -63,12 +85,54 @@ def upload_file():
         "files": uploaded_files
     }, 200)
 
+def run_ingest_job(job):
+    """Extract, embed and save the files of an ingestion job. Runs on the JobQueue thread."""
+    content_cache = ContentCache(db, job.project_name)  # Skips or copies work done for earlier uploads
+
+    def chunks():
+        for chunk in handler.iter_chunks(content_cache=content_cache, files=job.files, file_names=job.file_names, progress=job.file_done):
+            job.chunk_done()  # Counts progress and stops here when the job is cancelled
+            yield chunk
+
+    # Chunks are embedded and saved batch by batch while the files are processed
+    inserted = db.insert_chunks_stream(job.project_name, chunks())
+    if SYNONYM_MODE != "llm":
+        term_indexes.get(job.project_name)  # Rebuild the vocabulary now instead of on the next synonym request
+    return {
+        "chunks": inserted,
+        "errors": dict(handler.errors),
+        "embedding": handler.embedding_stats,
+        "cache": content_cache.stats()
+    }
+
+jobs = JobQueue(run_ingest_job)  # Background ingestion, smallest upload first
+
 @app.route("/process-files", methods=["POST"])
 def process_files():
-    """Process uploaded files."""
-    handler.process_all_files() # processes them
-    db.insert_chunks(handler.get_project_name(), handler.get_results())  # Save chunks to the database
-    return jsonify({"message": "Files processed successfully"}), 200
+    """Queue the uploaded files for processing. Poll /jobs/<job_id> for progress."""
+    if not handler.files:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    job = jobs.submit(handler.get_project_name(), handler.files, handler.get_file_names())
+    return jsonify({"message": "Processing started", "job_id": job.job_id, "status": job.to_dict()}), 202
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in jobs.list()]}), 200
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Return the state and progress (files/pages/chunks done, throughput) of an ingestion job."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({"error": "Job not found or already finished"}), 404
+    return jsonify({"message": f"Job '{job_id}' cancelled."}), 200
 
 
 def scope_transaltion(scope):
@@ -82,6 +146,52 @@ def scope_transaltion(scope):
     else:
         return 0.5
 
+def scan_keywords(project_name, keywords, temp, full=False):
+    """
+    Search the keywords semantically and exactly, save the hits and mark the chunks as scanned.
+
+    Every keyword only searches the chunks added since it was last searched with this threshold or a
+    lower one (its watermark, see ChunkDatabase.get_scan_watermarks); a new keyword searches all of
+    them. `full` ignores the watermarks and searches everything again.
+    """
+    up_to = db.get_last_chunk_rowid()  # Chunks added while this search runs are left for the next one
+    watermarks = {} if full else db.get_scan_watermarks(project_name, keywords, temp)
+    by_watermark = {}
+    for keyword in keywords:
+        by_watermark.setdefault(watermarks.get(keyword, 0), []).append(keyword)
+
+    # Cached FAISS index, built on first use and rebuilt when another process changed the project
+    f = index_cache.get_index(project_name, db.get_vectors_by_project, state=db.get_project_state(project_name))
+    scanned_up_to = up_to
+    for after, group in by_watermark.items():
+        if after >= up_to:
+            continue  # Nothing new for these keywords
+        chunks = db.get_chunks_between(project_name, after, up_to)
+        if not all(chunk_id in f for _, chunk_id in chunks):
+            # Chunks the index doesn't have (inserted since it was checked): rebuild it from the database
+            index_cache.drop_project(project_name)
+            f = index_cache.get_index(project_name, db.get_vectors_by_project)
+            chunks = db.get_chunks_between(project_name, after, up_to)  # Without the chunks deleted meanwhile
+
+        # The watermark only moves past chunks the index really searched
+        covered = up_to
+        for rowid, chunk_id in chunks:
+            if chunk_id not in f:
+                covered = rowid - 1
+                print(f"[WARNING] Chunk {chunk_id} of '{project_name}' is not in the index, searched up to rowid {covered}")
+                break
+        chunk_ids = None if after == 0 and covered == up_to else [chunk_id for rowid, chunk_id in chunks if rowid <= covered]
+
+        if chunk_ids is None or chunk_ids:
+            f.f_search(group, db, temperature=temp, chunk_ids=chunk_ids)  # Search for keywords in the FAISS index and save them in the database
+        for query in group:
+            db.add_exact_keyword_matches_to_chunks(query, project_name, after=after, up_to=covered)
+        db.set_scan_watermarks(project_name, group, temp, covered)
+        scanned_up_to = min(scanned_up_to, covered)
+        print(f"[INFO] Searched {len(group)} keywords in {'all' if chunk_ids is None else len(chunk_ids)} chunks of '{project_name}'")
+
+    db.mark_project_chunks_scanned(project_name, up_to=scanned_up_to)
+
 @app.route("/search", methods=["POST"])
 def search():
     data = request.json
@@ -94,15 +204,9 @@ def search():
     if not isinstance(keywords, list):
         return jsonify({"error": "No keyword provided"}), 400
     
-    emb = db.get_embeddings_by_project(handler.get_project_name())  # Get chunks from the database
-
-    f = FaissIndex(emb, temperature=temp)  # Initialize the FAISS index
-    f.f_search(keywords, db)  # Search for keywords in the FAISS index and save them in the database
-    for query in keywords:
-        db.add_exact_keyword_matches_to_chunks(query, handler.get_project_name())
+    scan_keywords(handler.get_project_name(), keywords, temp, full=True)  # Every chunk, ignoring earlier searches
     #print("[DEBUG] Manually calling add_keyword_and_distance()...")
     #db.add_keyword_and_distance("2b5813b4-0079-40b3-aea3-3c886eb2469e", "machine", 0.123)
-    db.mark_project_chunks_scanned(handler.get_project_name())
     return jsonify({"message": "Search completed!"})
 
 @app.route("/search_unscanned", methods=["POST"])
@@ -116,15 +220,9 @@ def search_unscanned():
     if not isinstance(keywords, list):
         return jsonify({"error": "No keyword provided"}), 400
 
-    emb = db.get_new_embeddings_by_project(handler.get_project_name())  # Get chunks from the database
-
-    f = FaissIndex(emb, temperature=temp)  # Initialize the FAISS index
-    f.f_search(keywords, db)  # Search for keywords in the FAISS index and save them in the database
-    for query in keywords:
-        db.add_exact_keyword_matches_to_chunks(query, handler.get_project_name())
+    scan_keywords(handler.get_project_name(), keywords, temp)  # Only the chunk/keyword pairs not searched yet
     #print("[DEBUG] Manually calling add_keyword_and_distance()...")
     #db.add_keyword_and_distance("2b5813b4-0079-40b3-aea3-3c886eb2469e", "machine", 0.123)
-    db.mark_project_chunks_scanned(handler.get_project_name())
     return jsonify({"message": "Search completed!"})
 
 # @app.route("/download_zip", methods=["GET"])
@@ -146,38 +244,65 @@ def getting_syn():
 
         if not keywords:
             return jsonify({"error": "No keywords provided"}), 400
-            
-        for keyword in keywords: 
-            if db_handler.is_saved(keyword):
-                synonyms = db_handler.get_synonyms(keyword)
-            else: 
-                prompt = f'Find 5 dutch synonyms of {keyword}'
-                synonyms = syn.generate_synonyms(prompt)
-                db_handler.add_synonyms(keyword, synonyms)
 
+        # "local": nearest terms of the project's own vocabulary, no LLM call.
+        # "hybrid": local terms are saved as synonyms, only keywords without any go to the LLM.
+        mode = data.get("mode", SYNONYM_MODE)
+        if mode not in ("llm", "local", "hybrid"):
+            return jsonify({"error": f"Unknown mode '{mode}'"}), 400
+        if mode != "llm":
+            project_name = data.get("project_name") or handler.get_project_name()
+            local = term_indexes.expand(project_name, keywords)
+            if mode == "hybrid":
+                db_handler.add_many({keyword: terms for keyword, terms in local.items() if terms and not db_handler.is_saved(keyword)})
+
+        if mode == "local":
+            result = {"synonyms": local, "pending": [], "failed": {}}
+        else:
+            # New keywords are generated concurrently, within the latency budget (optional "budget" in seconds)
+            result = synonym_service.get_synonyms(keywords, budget=data.get("budget"))
+        if result["failed"] and not result["synonyms"] and not result["pending"]:
+            raise RuntimeError("; ".join(f"{keyword}: {error}" for keyword, error in result["failed"].items()))
+
+        for synonyms in result["synonyms"].values():
             all_words.extend(synonyms)
             # print(f'MAIN;"{keyword}" synonyms: {synonyms}')
 
         all_words = list(set(word.lower() for word in all_words))
-        
-        return jsonify({"synonyms": all_words}), 200
+
+        # "pending" keywords are still being generated and will be saved, ask again for their synonyms
+        return jsonify({"synonyms": all_words, "pending": result["pending"], "failed": list(result["failed"])}), 200
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/index_cache_stats", methods=["GET"])
+def index_cache_stats():
+    """Return hit/miss/build-time counters of the FAISS index cache."""
+    return jsonify(index_cache.stats()), 200
+
+@app.route("/synonym_stats", methods=["GET"])
+def synonym_stats():
+    """Saved hits, LLM calls, coalesced and timed out keywords of /get_synonyms."""
+    return jsonify(synonym_service.stats()), 200
+
+@app.route("/query_cache_stats", methods=["GET"])
+def query_cache_stats():
+    """Size and hit rate of the keyword/synonym embedding cache."""
+    return jsonify(get_query_cache().stats()), 200
+
 @app.route("/uploaded_files", methods=["GET"])
 def list_uploaded_files():
+    """Files of a project (default: the current one) from the file catalog."""
+    project_name = request.args.get("project_name") or handler.get_project_name()
     files = []
-    for filename in os.listdir(app.config["UPLOAD_FOLDER"]):
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        filename_ = "uploads/" + filename
-        if os.path.isfile(file_path):
-            files.append({
-                "filename": filename,
-                "uploaded_at": time.ctime(os.path.getmtime(file_path)),
-                "scanned": True,
-                "keywords": "N/A"
-            })
+    for status in db.get_files_scanned_status_and_time(project_name):
+        files.append({
+            "filename": status["file_name"],
+            "uploaded_at": status["upload_date"],
+            "scanned": status["scanned"],
+            "keywords": status["hit_count"]
+        })
     return jsonify({"files": files})
 
     
@@ -229,16 +354,13 @@ def set_project_name():
 @app.route("/projects", methods=["GET"]) # HERE IS THE IMPLEMENTATION
 def get_projects():
     try:
-        # Get list of project names
-        project_names = db.get_projects()  # e.g., ["project1", "project2", ...]
-
+        # Name, upload date and scan status of every project, one read of the catalog
         project_data = []
-        for name in project_names:
-            upload_date, scanned = db.get_project_time_and_status(name)
+        for project in db.get_project_overview():
             project_data.append({
-                "projectName": name,
-                "uploadDate": upload_date,
-                "scanned": scanned
+                "projectName": project["project_name"],
+                "uploadDate": project["upload_date"],
+                "scanned": project["scanned"]
             })
 
         return jsonify({"projects": project_data}), 200
@@ -251,6 +373,7 @@ def get_projects():
 def reset_db():
     try:
         db.reset_db()
+        term_indexes.clear()
         return jsonify({"status": "success", "message": "Database reset completed."}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -273,6 +396,7 @@ def delete_project():
             return jsonify({"error": "Missing project name"}), 400
 
         db.delete_project(project_name)
+        term_indexes.drop_project(project_name)
         return jsonify({"success": True, "message": f"Project '{project_name}' deleted successfully."}), 200
 
     except Exception as e:
@@ -289,6 +413,7 @@ def delete_file_endpoint():
             return jsonify({"error": "Missing project_name or file_name"}), 400
 
         db.delete_file(project_name, file_name)
+        term_indexes.drop_project(project_name)  # Its vocabulary changed, rebuilt on the next synonym request
         return jsonify({"message": f"File '{file_name}' deleted from project '{project_name}'."}), 200
 
     except Exception as e:
@@ -1,16 +1,20 @@
 import os
 import logging
+import multiprocessing
 from typing import List, Dict, Any
-from transformers import AutoTokenizer
-from torch import Tensor
-from sentence_transformers import SentenceTransformer
-import PyPDF2
-from docx import Document
-import pytesseract
-from pdf2image import convert_from_path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from ocr import OcrEngine
 from constants import get_model
+from embedding_batcher import EmbeddingBatcher
+from content_cache import ContentCache, file_sha256, text_sha256
 import re
 import string
+import tempfile
+import importlib.util
+
+# The PDF and DOCX libraries are imported by the extractors that use them
+HAS_PYMUPDF = importlib.util.find_spec("pymupdf") is not None
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -33,14 +37,20 @@ class FileHandler:
             files: List of file paths to process. If None, no files are loaded.
         """
         if not hasattr(self, "initialized"):  # Ensure __init__ runs only once
-            self.tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
-            self.embedder = get_model()
+            self.extractor = TextExtractor()
             self.files = files or []
             self.results = {}
+            self.errors = {}  # file name -> extraction error of the last process_all_files run
+            self.embedding_stats = {}  # EmbeddingBatcher stats of the last run
             self.project_name = None
             self.initialized = True  # Mark as initialized
             self.last_focus = {}  # Track the last focused file per project
 
+    @property
+    def embedder(self):
+        """The embedding model, loaded on first use."""
+        return get_model()
+
     # Set last focus for a project
     def set_last_focus(self, project_name: str, focus_value):
         if not project_name:
@@ -119,33 +129,224 @@ class FileHandler:
             return []
         return self.actual_names
 
-    def process_all_files(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Process all files and return tokenized and embedded chunks."""
+    def process_all_files(self, max_workers: int = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Process all files and return tokenized and embedded chunks.
+
+        Keeps every chunk in memory, use iter_chunks() to stream large uploads into the database instead.
+        """
         if not self.files:
             logger.warning("No files to process")
             return {}
 
-        actual_names = self.get_actual_names()  # Get actual names if set
-        for i, file_path in enumerate(self.files):
-            logger.info(f"Processing file: {file_path}")
-            chunks = self.extract_text_chunks(file_path)  # Extract text chunks
+        results = {}
+        for chunk in self.iter_chunks(max_workers):
+            file_key = chunk.pop("file_name")
+            results.setdefault(file_key, []).append(chunk)
 
-            # Embed text directly
-            embeddings = self.get_embeddings([chunk["content"] for chunk in chunks])
+        # Files finish extracting in any order, keep the upload order
+        self.results = {key: results.get(key, []) for key in self.get_file_names() if key not in self.errors}
+        # logger.debug(f"Results structure: {results}")
+        self.set_results(self.results)  # Set results for each file
+        return self.results
 
-            # Use actual name if available and valid, otherwise use the filename from the path
-            file_key = actual_names[i] if actual_names and i < len(actual_names) else os.path.basename(file_path)
-            self.results[file_key] = [
+    def iter_chunks(self, max_workers: int = None, batch_size: int = None, content_cache: ContentCache = None,
+                    files: List[str] = None, file_names: List[str] = None, progress=None):
+        """
+        Stream the embedded chunks of all files: extract -> chunk -> embed, one chunk dict at a time.
+
+        Text extraction (PDF parsing, OCR) runs in a process pool while this thread embeds the files that
+        are already extracted. Chunks of all files go through one EmbeddingBatcher, which encodes them in
+        length-sorted batches of `batch_size` and yields them file by file in document order. Nothing is
+        kept after a chunk is yielded, so memory does not grow with the size of the upload. A file that
+        fails to extract is logged in self.errors and skipped.
+
+        With a ContentCache, unchanged files are skipped, files uploaded before are copied and chunks
+        with an already embedded text reuse that embedding.
+
+        `files`/`file_names` process other files than the ones set on the handler (background jobs keep
+        their own list). `progress(file_key, pages)` is called once per file when it is done.
+        """
+        self.errors = {}
+        if files is None:
+            files, file_names = self.files, self.get_file_names()
+        if not files:
+            logger.warning("No files to process")
+            return
+        if progress is None:
+            progress = lambda file_key, pages: None
+
+        copies = []  # (file_key, file_hash) of files whose chunks can be copied from an earlier upload
+
+        def files_to_extract():
+            for file_key, file_path in zip(file_names, files):
+                try:
+                    file_hash = file_sha256(file_path)
+                except OSError as e:
+                    logger.error(f"Skipping {file_key}: {e}")
+                    self.errors[file_key] = str(e)
+                    progress(file_key, 0)
+                    continue
+                if content_cache is not None:
+                    if content_cache.is_unchanged(file_hash, file_key):
+                        progress(file_key, 0)
+                        continue
+                    if content_cache.has_file(file_hash):
+                        copies.append((file_key, file_hash))
+                        continue
+                yield file_key, file_path, file_hash
+
+        batcher = EmbeddingBatcher(self.embedder, batch_size=batch_size)
+        def copy_files():
+            while copies:
+                file_key, file_hash = copies.pop(0)
+                chunks = list(content_cache.copy_file(file_key, file_hash))
+                content_cache.replace_old_version(file_hash, file_key)
+                progress(file_key, len({chunk["metadata"]["page"] for chunk in chunks}))
+                yield from batcher.add(chunks)  # Already embedded, the batcher only keeps them in order
+
+        for file_key, file_hash, chunks in self._extract_all(files_to_extract(), len(files), max_workers, progress):
+            items = [
                 {
-                    "content": chunks[i]["content"],
-                    "embedding": embeddings[i],
-                    "metadata": chunks[i]["metadata"]
+                    "file_name": file_key,
+                    "file_hash": file_hash,
+                    "file_chunk_count": len(chunks),  # The version counts as stored once all of these are
+                    "chunk_hash": text_sha256(chunk["content"]),
+                    "content": chunk["content"],
+                    "metadata": chunk["metadata"]
                 }
-                for i in range(len(chunks))
+                for chunk in chunks
             ]
-        # logger.debug(f"Results structure: {results}")
-        self.set_results(self.results)  # Set results for each file
-        return self.results
+            if content_cache is not None:
+                content_cache.split_cached(items)  # Sets cached embeddings, may reuse those of the old version
+                content_cache.replace_old_version(file_hash, file_key)
+            yield from batcher.add(items)
+            progress(file_key, len({chunk["metadata"]["page"] for chunk in chunks}))
+
+            yield from copy_files()
+        yield from copy_files()
+        yield from batcher.flush()
+
+        self.embedding_stats = batcher.stats()
+        logger.info(f"Embedding throughput: {self.embedding_stats}")
+        if content_cache is not None:
+            logger.info(f"Content cache: {content_cache.stats()}")
+
+    def get_file_names(self) -> List[str]:
+        # Use actual name if available and valid, otherwise use the filename from the path
+        actual_names = self.get_actual_names()
+        return [
+            actual_names[i] if actual_names and i < len(actual_names) else os.path.basename(file_path)
+            for i, file_path in enumerate(self.files)
+        ]
+
+    def _extract_all(self, files, file_count: int, max_workers: int = None, progress=None):
+        """
+        Extract (file_key, file_path, file_hash) entries and yield (file_key, file_hash, chunks) for
+        every file as soon as its extraction finishes. Failed files are reported to `progress` with 0 pages.
+
+        At most two files per worker are in flight, so finished extractions don't pile up in memory
+        while the consumer is still embedding.
+        """
+        if progress is None:
+            progress = lambda file_key, pages: None
+        if max_workers is None:
+            max_workers = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+        max_workers = max(1, min(max_workers, file_count))
+
+        if max_workers == 1:
+            for file_key, file_path, file_hash in files:
+                logger.info(f"Processing file: {file_path}")
+                try:
+                    chunks = self.extract_text_chunks(file_path)
+                except Exception as e:
+                    logger.error(f"Skipping {file_key}: {e}")
+                    self.errors[file_key] = str(e)
+                    progress(file_key, 0)
+                    continue
+                yield file_key, file_hash, chunks
+            return
+
+        logger.info(f"Extracting {file_count} files with {max_workers} worker processes")
+        pending_files = iter(files)
+        # Spawned, not forked: this process runs threads (Flask, the job queue, uploads) and may hold
+        # the model, a forked child could inherit a lock held by another thread and hang
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            running = {}
+            while True:
+                for file_key, file_path, file_hash in islice(pending_files, 2 * max_workers - len(running)):
+                    running[pool.submit(_extract_file, file_path)] = (file_key, file_hash)
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_key, file_hash = running.pop(future)
+                    try:
+                        chunks = future.result()
+                    except Exception as e:
+                        logger.error(f"Skipping {file_key}: {e}")
+                        self.errors[file_key] = str(e)
+                        progress(file_key, 0)
+                        continue
+                    yield file_key, file_hash, chunks
+
+    def extract_text_chunks(self, file_path: str) -> List[Dict[str, Any]]:
+        return self.extractor.extract_text_chunks(file_path)
+
+    def get_embeddings(self, text_chunks: List[str]):
+        return self.embedder.encode(text_chunks, convert_to_numpy=True)
+
+
+def _page_needs_ocr(page) -> bool:
+    """
+    Whether a PyMuPDF page without a text layer shows anything to OCR: an image (also inline ones) or
+    a drawing that is stroked or filled in another colour than white, e.g. text converted to curves
+    in a CAD export. Almost every page has content streams, blank ones often just paint a white background.
+    """
+    if page.get_image_info():
+        return True
+    return any(
+        path.get("color") is not None or path.get("fill") not in (None, (1.0, 1.0, 1.0))
+        for path in page.get_drawings()
+    )
+
+
+def _extract_file(file_path: str) -> List[Dict[str, Any]]:
+    """Process pool entry point. Only the path is sent to the worker, never the FileHandler and its model."""
+    return TextExtractor().extract_text_chunks(file_path)
+
+
+# ____________________________ Extractor registry ___________________________
+
+# Extension -> {engine name: function(extractor, file_path) -> [(page_number, text), ...]}
+EXTRACTORS = {}
+
+# Engine used when several are registered for an extension. PDF_ENGINE selects the PDF engine.
+DEFAULT_ENGINES = {".pdf": os.getenv("PDF_ENGINE", "pymupdf" if HAS_PYMUPDF else "pypdf2")}
+
+
+def register_extractor(extension: str, engine: str):
+    """Register a TextExtractor method as the `engine` for files with `extension`."""
+    def decorator(func):
+        EXTRACTORS.setdefault(extension, {})[engine] = func
+        return func
+    return decorator
+
+
+class TextExtractor:
+    """Extracts text from PDF, DOCX and TXT files and splits it into chunks. Cheap to create in worker processes."""
+
+    def __init__(self, ocr: OcrEngine = None, engines: Dict[str, str] = None, use_ocr: bool = True):
+        """
+        Args:
+            ocr: OCR engine for image-only pages, created on the first one if not given.
+            engines: Extension -> engine name, overrides DEFAULT_ENGINES.
+            use_ocr: False leaves image-only pages empty (used by the extraction benchmark).
+        """
+        self.ocr = ocr
+        self.engines = {**DEFAULT_ENGINES, **(engines or {})}
+        self.use_ocr = use_ocr
 
     def _split_text(self, text, sent_length):
         """
@@ -223,18 +424,10 @@ class FileHandler:
         Extract text from a file and split into chunks.
         """
 
-        file_ext = os.path.splitext(file_path)[1].lower()
         chunks = []
 
         try:
-            if file_ext == '.pdf':
-                text_pages = self._extract_pdf_text_with_pages(file_path)
-            elif file_ext == '.docx':
-                text_pages = self._extract_docx_text_with_pages(file_path)
-            elif file_ext == '.txt':
-                text_pages = [(1, self._extract_txt_text(file_path))]
-            else:
-                raise ValueError(f"Unsupported file type: {file_ext}")
+            text_pages = self.extract_pages(file_path)
 
             for page_num, text in text_pages:
                 if not text.strip():
@@ -249,7 +442,7 @@ class FileHandler:
                         # print(f"Processing sub-chunk: {sub_chunk, len(sub_chunk)} ")  # Debugging output
                         chunks.append({
                             "content": sub_chunk,
-                            "metadata": {"page": page_num}
+                            "metadata": {"page": page_num, "chunk_index": len(chunks)}  # Position in the file, part of the chunk ID
                         })
 
         except Exception as e:
@@ -258,31 +451,88 @@ class FileHandler:
 
         return chunks
 
+    def extract_pages(self, file_path: str) -> List[tuple[int, str]]:
+        """Extract [(page_number, text), ...] with the engine selected for the file's extension."""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        engines = EXTRACTORS.get(file_ext)
+        if not engines:
+            raise ValueError(f"Unsupported file type: {file_ext}")
+
+        engine = self.engines.get(file_ext) or next(iter(engines))
+        if engine not in engines:
+            raise ValueError(f"Unknown {file_ext} extraction engine '{engine}', available: {list(engines)}")
+        return engines[engine](self, file_path)
+
+    @register_extractor(".pdf", "pymupdf")
+    def _extract_pdf_text_pymupdf(self, file_path: str) -> List[tuple[int, str]]:
+        """
+        Extract text from PDF with PyMuPDF, OCR pages without a text layer.
+
+        A page without text is only sent to OCR when it shows something, see _page_needs_ocr: blank
+        pages are skipped. Those pages are rendered by PyMuPDF itself, so poppler is not needed.
+        """
+        if not HAS_PYMUPDF:
+            raise ImportError("PyMuPDF is not installed, use the 'pypdf2' PDF engine")
+        import pymupdf
+
+        text_pages = []
+        image_pages = []
+        with pymupdf.open(file_path) as doc:
+            for page in doc:
+                text = page.get_text("text")
+                text_pages.append((page.number + 1, text))
+                if not text.strip() and _page_needs_ocr(page):
+                    image_pages.append(page.number + 1)
+
+            if image_pages and self.use_ocr:
+                logger.info(f"Pages {image_pages} are images, running OCR...")
+                ocr = self._get_ocr()
+                with tempfile.TemporaryDirectory() as folder:
+                    images = {}
+                    for page_num in image_pages:
+                        path = os.path.join(folder, f"page-{page_num}.ppm")
+                        doc[page_num - 1].get_pixmap(dpi=ocr.dpi).save(path)
+                        images[page_num] = path
+                    ocr_texts = ocr.ocr_images(images)
+                text_pages = [(page_num, ocr_texts.get(page_num, text)) for page_num, text in text_pages]
+
+        return text_pages
+
+    @register_extractor(".pdf", "pypdf2")
     def _extract_pdf_text_with_pages(self, file_path: str) -> List[tuple[int, str]]:
         """
         Extract text from PDF with OCR if needed.
         """
+        import PyPDF2
+
         text_pages = []
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             for page_num in range(len(pdf_reader.pages)):
                 page = pdf_reader.pages[page_num]
-                text = page.extract_text()
+                text_pages.append((page_num + 1, page.extract_text() or ""))
 
-                if not text.strip():
-                    logger.info(f"Page {page_num + 1} is an image, running OCR...")
-                    images = convert_from_path(file_path, first_page=page_num + 1, last_page=page_num + 1)
-                    ocr_text = pytesseract.image_to_string(images[0]) if images else "[OCR Failed]"
-                    text_pages.append((page_num + 1, ocr_text.strip()))
-                else:
-                    text_pages.append((page_num + 1, text))
+        # OCR all image-only pages of the file in one go
+        image_pages = [page_num for page_num, text in text_pages if not text.strip()]
+        if image_pages and self.use_ocr:
+            logger.info(f"Pages {image_pages} are images, running OCR...")
+            ocr_texts = self._get_ocr().ocr_pdf_pages(file_path, image_pages)
+            text_pages = [(page_num, ocr_texts.get(page_num, text)) for page_num, text in text_pages]
 
         return text_pages
 
+    def _get_ocr(self) -> OcrEngine:
+        if self.ocr is None:
+            self.ocr = OcrEngine()
+        return self.ocr
+
+    @register_extractor(".docx", "python-docx")
     def _extract_docx_text_with_pages(self, file_path: str) -> List[tuple[int, str]]:
         """
         Extract text from DOCX.
         """
+        from docx import Document
+
         doc = Document(file_path)
         text_pages = []
         current_text = []
@@ -302,6 +552,10 @@ class FileHandler:
             text_pages.append((page_num, "\n".join(current_text)))
         return text_pages
 
+    @register_extractor(".txt", "text")
+    def _extract_txt_pages(self, file_path: str) -> List[tuple[int, str]]:
+        return [(1, self._extract_txt_text(file_path))]
+
     def _extract_txt_text(self, file_path: str) -> str:
         """
         Extract text from a TXT file.
@@ -334,9 +588,6 @@ class FileHandler:
 
         return chunks
 
-    def get_embeddings(self, text_chunks: List[str]):
-        return self.embedder.encode(text_chunks, convert_to_numpy=True)
-
     def _clean_text(self, text: str) -> str:
         """
         Clean excessive dots, new lines, bullet points, and other unnecessary characters from the text.
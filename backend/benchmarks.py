@@ -0,0 +1,262 @@
+"""
+Performance benchmarks, run from the backend folder:
+
+    python benchmarks.py extraction <folder with PDFs> [--engines pymupdf pypdf2]
+    python benchmarks.py startup [--repeat 5]
+    python benchmarks.py quantization [--db file_chunks.sqlite] [--projects A B] [--threshold 0.5]
+    python benchmarks.py synonyms [--keywords 5] [--requests 20] [--latency 0.5]
+    python benchmarks.py insert [--rows 100000] [--dimension 384] [--batch-size 1000]
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import statistics
+import tempfile
+import subprocess
+import numpy as np
+
+
+def bench_extraction(folder: str, engines, repeat: int = 1):
+    """Pages/sec of each PDF engine over the PDFs in `folder`, text layer only (no OCR)."""
+    from backend_filepro import TextExtractor, EXTRACTORS
+
+    files = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(".pdf"))
+    if not files:
+        sys.exit(f"No PDF files found in {folder}")
+
+    print(f"{'engine':<10} {'files':>6} {'pages':>8} {'chars':>12} {'seconds':>9} {'pages/sec':>10}")
+    for engine in engines or list(EXTRACTORS[".pdf"]):
+        extractor = TextExtractor(engines={".pdf": engine}, use_ocr=False)
+        pages = chars = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for file_path in files:
+                text_pages = extractor.extract_pages(file_path)
+                pages += len(text_pages)
+                chars += sum(len(text) for _, text in text_pages)
+        elapsed = time.perf_counter() - start
+        print(f"{engine:<10} {len(files):>6} {pages:>8} {chars:>12} {elapsed:>9.2f} {pages / elapsed if elapsed else 0:>10.1f}")
+
+
+# Run in a fresh interpreter: seconds to import the app, then seconds to load the model
+_STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import app
+ready = time.perf_counter() - start
+from constants import warm_up
+print(ready, warm_up())
+"""
+
+
+def bench_startup(repeat: int = 5):
+    """Import-to-ready time of app.py in fresh processes, and the model warm-up that follows."""
+    env = dict(os.environ, WARM_UP="off")
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    ready_times, warm_up_times = [], []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SCRIPT], cwd=backend_dir, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        ready, warm_up = map(float, result.stdout.split()[-2:])
+        ready_times.append(ready)
+        warm_up_times.append(warm_up)
+
+    print(f"{'phase':<10} {'runs':>5} {'min (s)':>9} {'median (s)':>11}")
+    for phase, times in (("import", ready_times), ("warm-up", warm_up_times)):
+        print(f"{phase:<10} {len(times):>5} {min(times):>9.2f} {statistics.median(times):>11.2f}")
+
+
+def bench_quantization(db_path: str, projects, threshold: float = 0.5, queries: int = 200, seed: int = 0):
+    """
+    Recall and memory of the float16 and int8 embedding formats against the exact float32 index.
+
+    For every project a sample of its own chunk vectors is used as queries. Each format goes through
+    the whole path: encoded to a BLOB, decoded and indexed, then range searched at `threshold`. Recall
+    is the share of the float32 hits that are still found, precision the share of found hits that
+    are float32 hits. Compare against a database that was filled with EMBEDDING_DTYPE=float32.
+    """
+    from db import ChunkDatabase
+    from faiss_index import FaissIndex
+    from quantization import EMBEDDING_DTYPES, encode_embedding, decode_embedding
+
+    db = ChunkDatabase(db_path)
+    rng = np.random.default_rng(seed)
+
+    print(f"{'project':<24} {'dtype':<8} {'chunks':>7} {'disk B/chunk':>13} {'index MB':>9} {'recall':>7} {'precision':>9} {'search ms':>10}")
+    for project_name in projects or db.get_projects():
+        embeddings = db.get_embeddings_by_project(project_name)
+        if not embeddings:
+            continue
+        vectors = np.array([embedding for _, embedding in embeddings], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        sample = vectors[rng.choice(len(vectors), size=min(queries, len(vectors)), replace=False)]
+        labels = [str(i) for i in range(len(sample))]
+
+        baseline = None
+        for dtype in EMBEDDING_DTYPES:
+            stored = [(chunk_id, decode_embedding(encode_embedding(embedding, dtype), dtype)) for chunk_id, embedding in embeddings]
+            index = FaissIndex(stored, temperature=threshold, dtype=dtype)
+            start = time.perf_counter()
+            found = index.range_search(sample, labels)
+            elapsed = (time.perf_counter() - start) * 1000
+            hits = {(chunk_id, query) for chunk_id, hit in found.items() for query in hit["queries"]}
+            if baseline is None:
+                baseline = hits
+            recall = len(hits & baseline) / len(baseline) if baseline else 1.0
+            precision = len(hits & baseline) / len(hits) if hits else 1.0
+            disk = len(encode_embedding(embeddings[0][1], dtype))
+            print(f"{project_name[:24]:<24} {dtype:<8} {len(embeddings):>7} {disk:>13} {index.nbytes() / 2**20:>9.2f} {recall:>7.4f} {precision:>9.4f} {elapsed:>10.1f}")
+
+
+def bench_synonyms(keywords: int = 5, requests: int = 20, latency: float = 0.5, budget: float = 10.0):
+    """
+    /get_synonyms offline, with the stub OpenAI client: the old serial loop against SynonymService.
+
+    `requests` concurrent requests ask for the same `keywords` new keywords, like several users
+    searching the same terms. Every stub LLM call takes about `latency` seconds.
+    """
+    os.environ["OPENAI_STUB"] = "1"
+    os.environ["OPENAI_STUB_LATENCY"] = str(latency)
+    os.environ["OPENAI_STUB_JITTER"] = "0"
+    from concurrent.futures import ThreadPoolExecutor
+    from constants import get_openai_client
+    from gen_syn import GenModel
+    from syn_database import DataHandler
+    from synonym_service import SynonymService
+
+    model = GenModel("gpt-4o", "Output only five words separated by commas")
+    generate = lambda keyword: model.request_synonyms(f"Find 5 dutch synonyms of {keyword}")
+    words = [f"term{i}" for i in range(keywords)]
+
+    print(f"{'mode':<10} {'requests':>9} {'keywords':>9} {'llm calls':>10} {'seconds':>8} {'ms/request':>11}")
+    with tempfile.TemporaryDirectory() as folder:
+        # Serial: one request, one LLM call per keyword (the old route)
+        store = DataHandler(os.path.join(folder, "serial.json"))
+        calls = get_openai_client().calls
+        start = time.perf_counter()
+        for keyword in words:
+            store.add_synonyms(keyword, generate(keyword))
+        elapsed = time.perf_counter() - start
+        print(f"{'serial':<10} {1:>9} {keywords:>9} {get_openai_client().calls - calls:>10} {elapsed:>8.2f} {elapsed * 1000:>11.0f}")
+
+        # Fan-out: concurrent requests share the calls in flight
+        service = SynonymService(generate, DataHandler(os.path.join(folder, "fanout.json")), budget=budget)
+        calls = get_openai_client().calls
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=requests) as clients:
+            results = list(clients.map(lambda _: service.get_synonyms(words), range(requests)))
+        elapsed = time.perf_counter() - start
+        pending = sum(len(result["pending"]) for result in results)
+        service.shutdown()  # Let calls past the budget finish before the store is removed
+        print(f"{'fan-out':<10} {requests:>9} {keywords:>9} {get_openai_client().calls - calls:>10} {elapsed:>8.2f} {elapsed * 1000 / requests:>11.0f}")
+        print(f"stats: {service.stats()}, pending answers: {pending}")
+
+
+def bench_insert(rows: int = 100000, dimension: int = 384, batch_size: int = 1000):
+    """
+    Rows/sec of ChunkDatabase.insert_chunks_stream against the old insert (one execute, uuid4,
+    timestamp and INFO line per row, one commit at the end), on a fresh database with synthetic
+    chunks. Logging goes to os.devnull. The bulk insert runs twice: the second pass re-ingests the
+    same files and must add nothing.
+    """
+    import uuid
+    import sqlite3
+    from datetime import datetime
+    from db import ChunkDatabase
+    from quantization import encode_embedding
+    from content_cache import text_sha256
+
+    logging.disable(logging.NOTSET)
+    devnull = open(os.devnull, "w")
+    logging.basicConfig(stream=devnull, level=logging.INFO, force=True)
+    logger = logging.getLogger("db")
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((min(rows, 1000), dimension)).astype(np.float32)  # Reused, the content doesn't matter
+    chunks = [
+        {
+            "file_name": f"file{i // 200}.pdf",
+            "file_hash": f"hash{i // 200}",
+            "content": f"chunk {i} " + "tekst " * 80,
+            "embedding": embeddings[i % len(embeddings)],
+            "metadata": {"page": i % 200 // 4, "chunk_index": i % 200}
+        }
+        for i in range(rows)
+    ]
+
+    print(f"{'mode':<12} {'rows':>8} {'stored':>8} {'seconds':>8} {'rows/sec':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        db = ChunkDatabase(os.path.join(folder, "old.sqlite"))
+        conn = sqlite3.connect(db.db_path)
+        start = time.perf_counter()
+        for i, chunk in enumerate(chunks):
+            conn.execute('''
+                INSERT INTO file_chunks (chunk_id, project_name, file_name, chunk_text, embedding, embedding_dtype, page_number, upload_date, file_hash, chunk_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (str(uuid.uuid4()), "bench", chunk["file_name"], chunk["content"], encode_embedding(chunk["embedding"], db.embedding_dtype),
+                  db.embedding_dtype, chunk["metadata"]["page"], datetime.now().isoformat(), chunk["file_hash"], text_sha256(chunk["content"])))
+            logger.info(f"Inserted chunk {i} from file '{chunk['file_name']}' (page {chunk['metadata']['page']})")
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        conn.close()
+        print(f"{'per-row':<12} {rows:>8} {rows:>8} {elapsed:>8.2f} {rows / elapsed:>10.0f}")
+
+        db = ChunkDatabase(os.path.join(folder, "bulk.sqlite"))
+        for mode in ("bulk", "re-ingest"):
+            start = time.perf_counter()
+            db.insert_chunks_stream("bench", iter(chunks), batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<12} {rows:>8} {db.count_chunks('bench'):>8} {elapsed:>8.2f} {rows / elapsed:>10.0f}")
+    devnull.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ScannerTSV performance benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    extraction = sub.add_parser("extraction", help="PDF text extraction engines, pages/sec")
+    extraction.add_argument("folder", help="Folder with the PDF fixture corpus")
+    extraction.add_argument("--engines", nargs="*", help="Engines to compare (default: all registered)")
+    extraction.add_argument("--repeat", type=int, default=1)
+
+    startup = sub.add_parser("startup", help="Import-to-ready time of the Flask app and the model warm-up")
+    startup.add_argument("--repeat", type=int, default=5)
+
+    quantization = sub.add_parser("quantization", help="Recall vs memory of float16/int8 embeddings against float32")
+    quantization.add_argument("--db", default="file_chunks.sqlite", help="SQLite database with the projects")
+    quantization.add_argument("--projects", nargs="*", help="Projects to measure (default: all)")
+    quantization.add_argument("--threshold", type=float, default=0.5, help="Similarity threshold of the range search")
+    quantization.add_argument("--queries", type=int, default=200, help="Sampled chunk vectors used as queries per project")
+
+    synonyms = sub.add_parser("synonyms", help="Serial vs concurrent synonym generation, offline with the stub OpenAI client")
+    synonyms.add_argument("--keywords", type=int, default=5, help="New keywords per request")
+    synonyms.add_argument("--requests", type=int, default=20, help="Concurrent requests for the same keywords")
+    synonyms.add_argument("--latency", type=float, default=0.5, help="Seconds per stub LLM call")
+    synonyms.add_argument("--budget", type=float, default=10.0, help="Latency budget per request in seconds")
+
+    insert = sub.add_parser("insert", help="Bulk vs per-row chunk inserts, rows/sec")
+    insert.add_argument("--rows", type=int, default=100000, help="Synthetic chunks to insert")
+    insert.add_argument("--dimension", type=int, default=384, help="Embedding dimension")
+    insert.add_argument("--batch-size", type=int, default=1000, help="Chunks per transaction of the bulk insert")
+
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Keep the per-file logging out of the results
+
+    if args.benchmark == "extraction":
+        bench_extraction(args.folder, args.engines, args.repeat)
+    elif args.benchmark == "startup":
+        bench_startup(args.repeat)
+    elif args.benchmark == "quantization":
+        bench_quantization(args.db, args.projects, args.threshold, args.queries)
+    elif args.benchmark == "synonyms":
+        bench_synonyms(args.keywords, args.requests, args.latency, args.budget)
+    elif args.benchmark == "insert":
+        bench_insert(args.rows, args.dimension, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
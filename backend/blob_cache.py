@@ -0,0 +1,147 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class _HashingWriter:
+    """File wrapper that hashes and counts everything written through it."""
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+
+class BlobCache:
+    """
+    Content-addressed disk cache of uploaded files: <root>/<sha256[:2]>/<sha256><extension>.
+
+    Uploads are written here while they are hashed, the blob upload and the ingestion read this copy,
+    and /download-multiple serves files from it instead of downloading them again. The cache is kept
+    under `max_bytes` by removing the least recently used files, but never files younger than
+    `min_age` seconds: an upload that is still waiting for ingestion must stay.
+
+    Settings default to the BLOB_CACHE_PATH, BLOB_CACHE_MAX_MB and BLOB_CACHE_MIN_AGE environment variables.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None, min_age: float = None):
+        self.root = root or os.getenv("BLOB_CACHE_PATH", "blob_cache")
+        self.max_bytes = max_bytes or int(os.getenv("BLOB_CACHE_MAX_MB", "2048")) * 1024 * 1024
+        self.min_age = min_age if min_age is not None else float(os.getenv("BLOB_CACHE_MIN_AGE", "3600"))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # path -> size, least recently used first
+        self._bytes = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index the files left by earlier runs, oldest use first (the mtime is bumped on every use)."""
+        found = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._bytes += size
+
+    def path(self, file_hash: str, extension: str = "") -> str:
+        return os.path.join(self.root, file_hash[:2], file_hash + extension.lower())
+
+    def get(self, file_hash: str, extension: str = "") -> Optional[str]:
+        """Path of the cached file, or None. Marks it as recently used."""
+        path = self.path(file_hash, extension)
+        with self._lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:  # Never cached, or evicted by another worker
+                self.misses += 1
+                if self._entries.pop(path, None) is not None:
+                    self._bytes = sum(self._entries.values())
+                return None
+            self.hits += 1
+            if path not in self._entries:
+                self._entries[path] = os.path.getsize(path)
+                self._bytes += self._entries[path]
+            self._entries.move_to_end(path)
+        return path
+
+    def put_stream(self, stream: BinaryIO, extension: str = "", block_size: int = 1024 * 1024) -> Tuple[str, str]:
+        """Write a stream into the cache while hashing it, in one pass. Returns (sha256, path)."""
+        def copy(f):
+            for block in iter(lambda: stream.read(block_size), b""):
+                f.write(block)
+        return self.put_with(copy, extension)
+
+    def put_with(self, write_into: Callable[[BinaryIO], None], extension: str = "") -> Tuple[str, str]:
+        """
+        Cache what `write_into(fileobj)` writes, e.g. BlobStore.download_to, hashed on the way.
+        Returns (sha256, path).
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                hashing = _HashingWriter(f)
+                write_into(hashing)
+            file_hash = hashing.digest.hexdigest()
+            path = self.path(file_hash, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)  # Same content, same name: replacing an existing copy is harmless
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._bytes += hashing.size - self._entries.pop(path, 0)
+            self._entries[path] = hashing.size
+            self._evict()
+        return file_hash, path
+
+    def _evict(self):
+        now = time.time()
+        for path in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                if now - os.path.getmtime(path) < self.min_age:
+                    break  # This and everything after it was used recently
+                os.remove(path)
+                self.evictions += 1
+                logger.info(f"Evicted {path} from the blob cache")
+            except FileNotFoundError:
+                pass
+            self._bytes -= self._entries.pop(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,91 @@
+import os
+import shutil
+import logging
+from typing import BinaryIO
+from werkzeug.utils import secure_filename
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class AzureBlobStore:
+    """
+    Files in an Azure Blob Storage container.
+
+    Uses the storage account name and key, or a connection string (e.g. for a local Azurite
+    emulator). The Azure SDK is imported and the client created on first use.
+
+    Files over `single_put_size` are uploaded as blocks of `block_size`, `max_concurrency` at a time.
+    """
+
+    def __init__(self, container_name: str, account_name: str = None, account_key: str = None, connection_string: str = None,
+                 max_concurrency: int = None, single_put_size: int = 8 * 1024 * 1024, block_size: int = 4 * 1024 * 1024):
+        self.container_name = container_name
+        self.account_name = account_name
+        self.account_key = account_key
+        self.connection_string = connection_string
+        self.max_concurrency = max_concurrency or int(os.getenv("UPLOAD_BLOCK_CONCURRENCY", "4"))
+        self.transfer_options = {"max_single_put_size": single_put_size, "max_block_size": block_size}
+        self._client = None
+
+    def _service_client(self):
+        if self._client is None:
+            from azure.storage.blob import BlobServiceClient
+            if self.connection_string:
+                self._client = BlobServiceClient.from_connection_string(self.connection_string, **self.transfer_options)
+            else:
+                self._client = BlobServiceClient(f"https://{self.account_name}.blob.core.windows.net", credential=self.account_key, **self.transfer_options)
+        return self._client
+
+    def _blob(self, name: str):
+        return self._service_client().get_blob_client(container=self.container_name, blob=name)
+
+    def upload(self, name: str, data: BinaryIO):
+        self._blob(name).upload_blob(data, overwrite=True, max_concurrency=self.max_concurrency)
+
+    def download_to(self, name: str, fileobj: BinaryIO):
+        """Write the blob into `fileobj` without holding it in memory as a whole."""
+        # Parallel ranges are written at their offsets, that needs a seekable target
+        seekable = getattr(fileobj, "seekable", lambda: False)()
+        self._blob(name).download_blob(max_concurrency=self.max_concurrency if seekable else 1).readinto(fileobj)
+
+
+class LocalBlobStore:
+    """Files in a local folder, a stand-in for the container in development and tests."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, secure_filename(name))
+
+    def upload(self, name: str, data: BinaryIO):
+        with open(self._path(name), "wb") as f:
+            shutil.copyfileobj(data, f, 1024 * 1024)
+
+    def download_to(self, name: str, fileobj: BinaryIO):
+        with open(self._path(name), "rb") as f:
+            shutil.copyfileobj(f, fileobj, 1024 * 1024)
+
+
+def blob_store_from_env():
+    """
+    The store selected by BLOB_STORE: "azure" (default) or "local".
+
+    azure: CONTAINER_NAME plus ACCOUNT_NAME and ACCOUNT_KEY, or AZURE_STORAGE_CONNECTION_STRING (Azurite).
+    local: the folder BLOB_STORE_PATH (default "blob_store").
+    """
+    kind = os.getenv("BLOB_STORE", "azure")
+    if kind == "local":
+        return LocalBlobStore(os.getenv("BLOB_STORE_PATH", "blob_store"))
+    if kind != "azure":
+        raise ValueError(f"BLOB_STORE must be 'azure' or 'local', got '{kind}'")
+
+    container_name = os.getenv("CONTAINER_NAME")
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    account_name = os.getenv("ACCOUNT_NAME")
+    account_key = os.getenv("ACCOUNT_KEY")
+    if not container_name or not (connection_string or (account_name and account_key)):
+        raise ValueError("Missing required environment variables: ACCOUNT_NAME, ACCOUNT_KEY, or CONTAINER_NAME")
+    return AzureBlobStore(container_name, account_name, account_key, connection_string)
@@ -1,32 +1,31 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
-import zipfile
-import io
-import tempfile
 from backend_filepro import FileHandler  # Assuming FileHandler is defined in backend_filepro.py
 from db import ChunkDatabase
+from blob_store import blob_store_from_env
+from blob_cache import BlobCache
+from zip_stream import stream_zip
 
 # Load environment variables from .env file
 load_dotenv()
 
 cloud_routes = Blueprint('routes', __name__)
 
-# Retrieve environment variables
-account_name = os.getenv("ACCOUNT_NAME")
-account_key = os.getenv("ACCOUNT_KEY")
-container_name = os.getenv("CONTAINER_NAME")
+# Azure container (or a local folder, BLOB_STORE=local) with the uploaded files.
+# Fails here when the environment variables are missing, the Azure client is created on first use.
+blob_store = blob_store_from_env()
+blob_cache = BlobCache()  # Local copies of uploaded files, by content hash
+db = ChunkDatabase()  # Shared by all requests, connections are pooled per thread
+upload_pool = ThreadPoolExecutor(max_workers=int(os.getenv("UPLOAD_WORKERS", "4")), thread_name_prefix="blob-upload")
 
-if not account_name or not account_key or not container_name:
-    raise ValueError("Missing required environment variables: ACCOUNT_NAME, ACCOUNT_KEY, or CONTAINER_NAME")
 
-# Create the BlobServiceClient using the storage account key
-blob_service_client = BlobServiceClient(
-    f"https://{account_name}.blob.core.windows.net",
-    credential=account_key
-)
+def _upload_cached(blob_name, path):
+    with open(path, "rb") as data:
+        print(f"Uploading file: {blob_name} to the blob store")
+        blob_store.upload(blob_name, data)
 
 
 @cloud_routes.route('/upload-multiple', methods=['POST'])
@@ -37,29 +36,30 @@ def upload_multiple_route():
         if not uploaded_files:
             return jsonify({"error": "No files provided"}), 400
 
-        temp_file_paths = []
+        cached_paths = []
         original_filenames = []
+        uploads = {}
 
         for file in uploaded_files:
             original_filename = file.filename
             original_filenames.append(original_filename)  # Store original filename
             filename = secure_filename(original_filename)
 
-            # Save locally to a temp file first
+            # Save into the blob cache, hashed while it is written, then upload that copy in the background
             file_ext = os.path.splitext(filename)[1] if filename else ''
-            temp = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
-            file.save(temp.name)
-            temp_file_paths.append(temp.name)
+            _, path = blob_cache.put_stream(file.stream, file_ext)
+            cached_paths.append(path)
+            uploads[upload_pool.submit(_upload_cached, filename, path)] = filename
 
-            # Then upload that saved file to Azure
-            with open(temp.name, "rb") as data:
-                blob_client = blob_service_client.get_blob_client(container=container_name, blob=filename)
-                print(f"Uploading file: {filename} to container: {container_name}")
-                blob_client.upload_blob(data, overwrite=True)
+        # The request returns when every file is in the blob store
+        wait(uploads)
+        failed = {filename: str(future.exception()) for future, filename in uploads.items() if future.exception() is not None}
+        if failed:
+            return jsonify({"error": "Upload to the blob store failed", "files": failed}), 500
 
         # Use singleton instance and initialize with file paths
         handler = FileHandler()
-        handler.initialize(temp_file_paths)
+        handler.initialize(cached_paths)
         handler.set_actual_names(original_filenames)  # Pass original filenames
 
         # # Optional: Process files here
@@ -80,33 +80,17 @@ def download_multiple_route():
         files = data.get('files', [])  # List of blob names
         project_name = data.get("project_name")
 
-        db = ChunkDatabase()
         keywords = db.get_all_retrieved_keywords_by_project(project_name)
         files = db.get_files_with_keywords(keywords, project_name)
 
         if not files:
             return jsonify({"error": "No files provided"}), 400
 
-        # Create in-memory ZIP archive
-        from werkzeug.utils import secure_filename
-
-        ...
-
-        # Create in-memory ZIP archive
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w') as zf:
-            for file_name in files:
-                blob_name = secure_filename(file_name)  # sanitize to match blob name
-                blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-                blob_data = blob_client.download_blob().readall()
-                zf.writestr(file_name, blob_data)  # keep original name inside the ZIP
-        memory_file.seek(0)
-
-        return send_file(
-            memory_file,
-            download_name='files.zip',
-            as_attachment=True,
-            mimetype='application/zip'
+        # Stream the ZIP while the blobs are downloaded, nothing is held in memory as a whole
+        return Response(
+            stream_zip(blob_store, files, cache=blob_cache, hashes=db.get_file_hashes(project_name, files)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=files.zip'}
         )
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400  # Custom error from DB function
@@ -1,7 +1,6 @@
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
-from openai import OpenAI 
 import os
+import time
 import logging
 
 # ____________________________ Constants ___________________________
@@ -13,13 +12,17 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
+# Heavy libraries (torch via sentence-transformers, openai) are imported on first use, not at startup.
+
 # ____________________________ Model for encoding into embeddings ___________________________
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
 _TRANS_MODEL = None
 
 def get_model():
     global _TRANS_MODEL
     if _TRANS_MODEL is None:
-        _TRANS_MODEL = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2') # paraphrase-multilingual-MiniLM-L12-v2
+        from sentence_transformers import SentenceTransformer
+        _TRANS_MODEL = SentenceTransformer(MODEL_NAME)
     return _TRANS_MODEL
 
 # ____________________________ OpenAI Client ___________________________
@@ -29,10 +32,25 @@ _OPENAI_CLIENT = None  # internal private instance
 
 def get_openai_client():
     global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None and os.getenv('OPENAI_STUB') == '1':
+        from openai_stub import StubOpenAIClient  # Offline load tests, see openai_stub.py
+        _OPENAI_CLIENT = StubOpenAIClient()
     if _OPENAI_CLIENT is None:
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             logger.error("OPENAI_API_KEY environment variable not set.")
             raise ValueError("API key must be set in the environment variable 'OPENAI_API_KEY'.")
+        from openai import OpenAI
         _OPENAI_CLIENT = OpenAI(api_key=api_key)
     return _OPENAI_CLIENT
+
+# ____________________________ Warm-up ___________________________
+
+def warm_up():
+    """Load the embedding model ahead of the first request. Returns the seconds it took."""
+    start = time.perf_counter()
+    get_model().encode(["warm-up"], convert_to_numpy=True)  # The first encode also initializes torch
+    elapsed = time.perf_counter() - start
+    logger.info(f"Model warm-up done in {elapsed:.2f}s")
+    return elapsed
+
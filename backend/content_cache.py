@@ -0,0 +1,109 @@
+import hashlib
+import logging
+from typing import List, Dict, Any, Iterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ContentCache:
+    """
+    Reuses the work of earlier uploads, using the file_hash and chunk_hash columns of file_chunks.
+
+    Only completely stored uploads count (the file_versions table): a file whose ingest was
+    interrupted is extracted again, the retry fills in its missing chunks.
+
+    - A file that is already in the project under the same name and content is skipped.
+    - A file uploaded again under the same name with new content replaces the old version.
+    - A file whose content was uploaded before (any project, any name) gets its chunks and
+      embeddings copied instead of being extracted, OCR'd and embedded again.
+    - A chunk whose text was embedded before gets that embedding instead of a new one.
+
+    Embeddings are looked up by text only, so the database must hold embeddings of a single model.
+    """
+
+    def __init__(self, db, project_name: str):
+        self.db = db
+        self.project_name = project_name
+
+        # Counters of avoided work, see stats()
+        self.files_skipped = 0
+        self.files_replaced = 0
+        self.files_copied = 0
+        self.chunks_copied = 0
+        self.chunks_reused = 0
+        self.chunks_embedded = 0
+
+    def is_unchanged(self, file_hash: str, file_name: str) -> bool:
+        """True when the project already holds this exact file under this name."""
+        if self.db.has_file_version(self.project_name, file_name, file_hash):
+            self.files_skipped += 1
+            logger.info(f"Skipping '{file_name}': unchanged since the last upload")
+            return True
+        return False
+
+    def replace_old_version(self, file_hash: str, file_name: str):
+        """
+        Delete the chunks (and their vectors and hits) of an earlier version of `file_name` in the
+        project. Called after its embeddings had the chance to be reused, before the new chunks are saved.
+        """
+        if self.db.has_other_version(self.project_name, file_name, file_hash):
+            self.files_replaced += 1
+            logger.info(f"Replacing the earlier version of '{file_name}'")
+            self.db.delete_file(self.project_name, file_name)
+
+    def has_file(self, file_hash: str) -> bool:
+        return self.db.has_file_hash(file_hash)
+
+    def copy_file(self, file_name: str, file_hash: str) -> Iterator[Dict[str, Any]]:
+        """Yield the chunks of an earlier upload of the same content, as new chunks of `file_name`."""
+        chunks = self.db.get_chunks_by_file_hash(file_hash)
+        self.files_copied += 1
+        self.chunks_copied += len(chunks)
+        logger.info(f"Copying {len(chunks)} chunks of '{file_name}' from an earlier upload")
+        for chunk in chunks:
+            chunk["file_name"] = file_name
+            chunk["file_chunk_count"] = len(chunks)
+            yield chunk
+
+    def split_cached(self, chunks: List[Dict[str, Any]]):
+        """
+        Set the embedding of chunks whose text was embedded before.
+
+        Returns (reused, missing): the chunks that got a cached embedding and the ones still to embed.
+        """
+        cached = self.db.get_embeddings_by_chunk_hashes([chunk["chunk_hash"] for chunk in chunks])
+        reused, missing = [], []
+        for chunk in chunks:
+            embedding = cached.get(chunk["chunk_hash"])
+            if embedding is None:
+                missing.append(chunk)
+            else:
+                chunk["embedding"] = embedding
+                reused.append(chunk)
+        self.chunks_reused += len(reused)
+        self.chunks_embedded += len(missing)
+        return reused, missing
+
+    def stats(self) -> dict:
+        return {
+            "files_skipped": self.files_skipped,
+            "files_replaced": self.files_replaced,
+            "files_copied": self.files_copied,
+            "chunks_copied": self.chunks_copied,
+            "chunks_reused": self.chunks_reused,
+            "chunks_embedded": self.chunks_embedded,
+        }
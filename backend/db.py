@@ -1,26 +1,55 @@
+import os
 import sqlite3
 import uuid
+import threading
 from datetime import datetime, timezone
+from collections import Counter
 import numpy as np
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 import pickle
 import logging
 import ast
+from content_cache import text_sha256
+from quantization import default_dtype, encode_embedding, decode_embedding
+from vector_store import normalize_rows
+from sqlite_pool import SQLitePool, retry_on_busy
 from ast import literal_eval
 
 # Configure logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Database files whose schema is set up in this process: absolute path -> fts_enabled
+_schema_ready = {}
+_schema_lock = threading.Lock()
+
+# Chunk IDs are uuid5 names in this namespace, see ChunkDatabase.chunk_id()
+_CHUNK_NAMESPACE = uuid.UUID("5b0f7c4e-3a52-4d0c-9a57-3c1e8f6d2b71")
+
 class ChunkDatabase:
-    def __init__(self, db_path="file_chunks.sqlite"):
+    def __init__(self, db_path="file_chunks.sqlite", index_cache=None, embedding_dtype=None, vector_store=None):
         self.db_path = db_path
-        self.init_db()
-
+        self.index_cache = index_cache  # Optional ProjectIndexCache kept in sync with inserts and deletes
+        self.vector_store = vector_store  # Optional VectorStore, same
+        self.embedding_dtype = embedding_dtype or default_dtype()  # Storage format of new embeddings, see quantization.py
+        self.pool = SQLitePool(db_path)  # One WAL-mode connection per thread, reused by every method
+
+        # Creating and migrating the schema once per process is enough, later instances reuse it
+        key = os.path.abspath(db_path)
+        with _schema_lock:
+            if key not in _schema_ready:
+                self.init_db()
+                _schema_ready[key] = self.fts_enabled
+            self.fts_enabled = _schema_ready[key]
+
+    def _connect(self):
+        return self.pool.connection()
+
+    @retry_on_busy()
     def init_db(self):
         try:
             logger.info("Initializing the database.")
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS file_chunks (
@@ -46,50 +75,352 @@ class ChunkDatabase:
                 cursor.execute("ALTER TABLE file_chunks ADD COLUMN scanned INTEGER DEFAULT 0")
             if "scanned_time" not in existing_columns:
                 cursor.execute("ALTER TABLE file_chunks ADD COLUMN scanned_time TEXT")
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_project ON file_chunks(project_name)')
+            # Content hashes used by ContentCache to skip or copy work of earlier uploads
+            if "file_hash" not in existing_columns:
+                cursor.execute("ALTER TABLE file_chunks ADD COLUMN file_hash TEXT")
+            if "chunk_hash" not in existing_columns:
+                cursor.execute("ALTER TABLE file_chunks ADD COLUMN chunk_hash TEXT")
+            # Storage format of the embedding BLOB, NULL for rows stored as float32 before the column existed
+            if "embedding_dtype" not in existing_columns:
+                cursor.execute("ALTER TABLE file_chunks ADD COLUMN embedding_dtype TEXT")
+            # Position of the chunk in its file, NULL for rows stored before the column existed
+            if "chunk_index" not in existing_columns:
+                cursor.execute("ALTER TABLE file_chunks ADD COLUMN chunk_index INTEGER")
+            # Per-file and per-scan-state lookups, both also serve plain project_name lookups
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_project_file ON file_chunks(project_name, file_name)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_project_scanned ON file_chunks(project_name, scanned)')
+            cursor.execute('DROP INDEX IF EXISTS idx_project')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_file_hash ON file_chunks(file_hash)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_chunk_hash ON file_chunks(chunk_hash)')
+
+            # One row per (chunk, keyword, source) hit. source is "semantic", "exact" or "legacy" (migrated)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS chunk_hits (
+                    chunk_id TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    source TEXT NOT NULL,
+                    PRIMARY KEY (chunk_id, keyword, source)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_hits_keyword ON chunk_hits(keyword)')
+            self._migrate_legacy_hits(cursor)
+            self.fts_enabled = self._init_fts(cursor)
+            self._init_catalog(cursor)
+
+            # Per keyword and threshold: every chunk of the project up to rowid `watermark` has been searched.
+            # Like chunk_fts it relies on stable rowids: clear it after a VACUUM, the next searches are full again
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS keyword_scans (
+                    project_name TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    threshold REAL NOT NULL,
+                    watermark INTEGER NOT NULL,
+                    scanned_time TEXT,
+                    PRIMARY KEY (project_name, keyword, threshold)
+                )
+            ''')
+
+            # File versions whose chunks are all stored, written by insert_chunks with the file's last chunk.
+            # Until a version is listed here ContentCache doesn't skip or copy it, so an interrupted ingest is redone
+            versions_exist = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'file_versions'").fetchone()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_versions (
+                    project_name TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    file_hash TEXT NOT NULL,
+                    PRIMARY KEY (project_name, file_name, file_hash)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_versions_hash ON file_versions(file_hash)')
+            if not versions_exist:
+                # Uploads stored before the table existed can't be checked, count them as complete
+                cursor.execute('''
+                    INSERT INTO file_versions (project_name, file_name, file_hash)
+                    SELECT DISTINCT project_name, file_name, file_hash FROM file_chunks
+                    WHERE project_name IS NOT NULL AND file_name IS NOT NULL AND file_hash IS NOT NULL
+                ''')
             conn.commit()
             conn.close()
         except Exception as e:
             logger.error(f"Error during database initialization: {e}")
             raise
 
+    def _init_fts(self, cursor) -> bool:
+        """
+        Create the chunk_fts full-text index over file_chunks.chunk_text, kept in sync by triggers.
+
+        The trigram tokenizer matches any substring of 3+ characters, so "vloer" still finds
+        "betonvloer" like the old LIKE '%kw%' scan did, and it is case-insensitive. On SQLite 3.45+
+        accents are folded too ("beton" finds "béton"). The index uses the implicit rowid of
+        file_chunks: call rebuild_fts_index() after a VACUUM.
+
+        Returns False when this SQLite build has no FTS5, the scans are used instead.
+        """
+        tokenizer = "trigram remove_diacritics 1" if sqlite3.sqlite_version_info >= (3, 45, 0) else "trigram"
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunk_fts'").fetchone()
+        try:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts
+                USING fts5(chunk_text, content='file_chunks', content_rowid='rowid', tokenize='{tokenizer}')
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 not available, exact keyword matching will scan all chunks: {e}")
+            return False
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_chunks_fts_insert AFTER INSERT ON file_chunks BEGIN
+                INSERT INTO chunk_fts(rowid, chunk_text) VALUES (new.rowid, new.chunk_text);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_chunks_fts_delete AFTER DELETE ON file_chunks BEGIN
+                INSERT INTO chunk_fts(chunk_fts, rowid, chunk_text) VALUES ('delete', old.rowid, old.chunk_text);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS file_chunks_fts_update AFTER UPDATE OF chunk_text ON file_chunks BEGIN
+                INSERT INTO chunk_fts(chunk_fts, rowid, chunk_text) VALUES ('delete', old.rowid, old.chunk_text);
+                INSERT INTO chunk_fts(rowid, chunk_text) VALUES (new.rowid, new.chunk_text);
+            END
+        ''')
+        if not exists:
+            # Index the chunks that were stored before the FTS table existed
+            cursor.execute("INSERT INTO chunk_fts(chunk_fts) VALUES ('rebuild')")
+            logger.info("Built the chunk_fts full-text index")
+        return True
+
+    def _init_catalog(self, cursor):
+        """
+        Create the projects and files catalog: one row per project and per file with its chunk count,
+        unscanned chunk count, first upload date, last scan time and number of keyword hits, so the
+        dashboard reads one row per project instead of scanning all chunks.
+
+        The chunk and scan counts are updated by insert_chunks, mark_project_chunks_scanned and the
+        delete methods in their own transactions. The hit counts are kept by triggers on chunk_hits.
+        """
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'files'").fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS projects (
+                project_name TEXT PRIMARY KEY,
+                upload_date TEXT,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                unscanned_count INTEGER NOT NULL DEFAULT 0,
+                scanned_time TEXT,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                project_name TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                upload_date TEXT,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                unscanned_count INTEGER NOT NULL DEFAULT 0,
+                scanned_time TEXT,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (project_name, file_name)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chunk_hits_catalog_insert AFTER INSERT ON chunk_hits BEGIN
+                UPDATE files SET hit_count = hit_count + 1
+                WHERE (project_name, file_name) = (SELECT project_name, file_name FROM file_chunks WHERE chunk_id = new.chunk_id);
+                UPDATE projects SET hit_count = hit_count + 1
+                WHERE project_name = (SELECT project_name FROM file_chunks WHERE chunk_id = new.chunk_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS chunk_hits_catalog_delete AFTER DELETE ON chunk_hits BEGIN
+                UPDATE files SET hit_count = hit_count - 1
+                WHERE (project_name, file_name) = (SELECT project_name, file_name FROM file_chunks WHERE chunk_id = old.chunk_id);
+                UPDATE projects SET hit_count = hit_count - 1
+                WHERE project_name = (SELECT project_name FROM file_chunks WHERE chunk_id = old.chunk_id);
+            END
+        ''')
+        if not exists:
+            # Catalog the chunks that were stored before the tables existed
+            self._rebuild_catalog(cursor)
+            logger.info("Built the projects and files catalog")
+
+    def _rebuild_catalog(self, cursor):
+        cursor.execute("DELETE FROM files")
+        cursor.execute("DELETE FROM projects")
+        cursor.execute('''
+            INSERT INTO files (project_name, file_name, upload_date, chunk_count, unscanned_count, scanned_time, hit_count)
+            SELECT c.project_name, c.file_name, MIN(c.upload_date), COUNT(*), SUM(COALESCE(c.scanned, 0) = 0),
+                   MAX(c.scanned_time), SUM(COALESCE(h.hits, 0))
+            FROM file_chunks c
+            LEFT JOIN (SELECT chunk_id, COUNT(*) AS hits FROM chunk_hits GROUP BY chunk_id) h ON h.chunk_id = c.chunk_id
+            WHERE c.project_name IS NOT NULL AND c.project_name != '' AND c.file_name IS NOT NULL
+            GROUP BY c.project_name, c.file_name
+        ''')
+        cursor.execute('''
+            INSERT INTO projects (project_name, upload_date, chunk_count, unscanned_count, scanned_time, hit_count)
+            SELECT project_name, MIN(upload_date), SUM(chunk_count), SUM(unscanned_count), MAX(scanned_time), SUM(hit_count)
+            FROM files
+            GROUP BY project_name
+        ''')
+
+    @retry_on_busy()
+    def rebuild_catalog(self):
+        """Recount the projects and files catalog from file_chunks and chunk_hits."""
+        conn = self._connect()
+        self._rebuild_catalog(conn.cursor())
+        conn.commit()
+        conn.close()
+
+    @retry_on_busy()
+    def rebuild_fts_index(self):
+        conn = self._connect()
+        conn.execute("INSERT INTO chunk_fts(chunk_fts) VALUES ('rebuild')")
+        conn.commit()
+        conn.close()
+
+    def _fts_phrase(self, keyword: str) -> str:
+        """Quote a keyword as an FTS5 phrase. With the trigram tokenizer a phrase matches as a substring."""
+        return '"' + keyword.replace('"', '""') + '"'
+
+    def _use_fts(self, keyword: str) -> bool:
+        # The trigram index can't answer substrings shorter than 3 characters
+        return self.fts_enabled and len(keyword.strip()) >= 3
+
+    @staticmethod
+    def chunk_id(project_name: str, file_name: str, file_hash: str, chunk_index: int) -> str:
+        """
+        ID of the chunk at `chunk_index` of a file version. Ingesting the same file again gives the
+        same IDs, so a retried or repeated ingestion updates its rows instead of duplicating them.
+        """
+        return str(uuid.uuid5(_CHUNK_NAMESPACE, f"{project_name}\0{file_name}\0{file_hash}\0{chunk_index}"))
+
+    # Same ID means same file content and position, only the embedding can differ (other model or dtype)
+    _UPSERT_CHUNK = '''
+        INSERT INTO file_chunks (chunk_id, project_name, file_name, chunk_text, embedding, embedding_dtype, page_number, upload_date, file_hash, chunk_hash, chunk_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(chunk_id) DO UPDATE SET embedding = excluded.embedding, embedding_dtype = excluded.embedding_dtype
+    '''
+
+    @retry_on_busy()
     def insert_chunks(self, project_name, results):
-        logger.info(f"Inserting chunks for project: {project_name}")
-        """Insert chunks and embeddings into the database."""
+        """
+        Insert chunks and embeddings into the database, in one transaction.
+
+        Chunks with a file_hash and a metadata["chunk_index"] get a deterministic ID (see chunk_id())
+        and replace their earlier copy. Only the chunks that were not stored yet are added to the
+        vector store and the index cache. Returns the number of new chunks.
+        """
         if not isinstance(results, list) or not all(isinstance(result, dict) for result in results):
             raise TypeError("Expected 'results' to be a list of dictionaries.")
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        upload_date = datetime.now().isoformat()
+        rows, embeddings = [], []
         for result in results:
-            chunk_id = str(uuid.uuid4())
             file_name = result["file_name"]
             chunk_text = result["content"]
-            page_number = result["metadata"].get("page", None)
-            upload_date = datetime.now().isoformat()
-            embedding_bytes = result["embedding"].tobytes()
-
+            file_hash = result.get("file_hash")
+            chunk_index = result["metadata"].get("chunk_index")
+            if file_hash is not None and chunk_index is not None:
+                chunk_id = self.chunk_id(project_name, file_name, file_hash, chunk_index)
+            else:
+                chunk_id = str(uuid.uuid4())
+            rows.append((
+                chunk_id, project_name, file_name, chunk_text,
+                encode_embedding(result["embedding"], self.embedding_dtype), self.embedding_dtype,
+                result["metadata"].get("page", None), upload_date, file_hash,
+                result.get("chunk_hash") or text_sha256(chunk_text), chunk_index
+            ))
+            embeddings.append(result["embedding"])
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")  # Take the write lock first, the existing IDs can't change before the insert
+        existing = set()
+        ids = [row[0] for row in rows]
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            cursor.execute(f"SELECT chunk_id FROM file_chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+            existing.update(row[0] for row in cursor.fetchall())
+        cursor.executemany(self._UPSERT_CHUNK, rows)
+
+        # A file version is complete once as many chunks are stored as it has ("file_chunk_count").
+        # Its chunks may be spread over batches in any order, so count what is stored now
+        expected = {
+            (result["file_name"], result["file_hash"]): result["file_chunk_count"]
+            for result in results
+            if result.get("file_hash") is not None and result.get("file_chunk_count") is not None
+        }
+        for (file_name, file_hash), chunk_count in expected.items():
             cursor.execute('''
-                INSERT INTO file_chunks (chunk_id, project_name, file_name, chunk_text, embedding, page_number, upload_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (chunk_id, project_name, file_name, chunk_text, embedding_bytes, page_number, upload_date))
-            logger.info(f"Inserted chunk {chunk_id} from file '{file_name}' (page {page_number})")
+                SELECT COUNT(*) FROM file_chunks WHERE project_name = ? AND file_name = ? AND file_hash = ?
+            ''', (project_name, file_name, file_hash))
+            if cursor.fetchone()[0] >= chunk_count:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO file_versions (project_name, file_name, file_hash) VALUES (?, ?, ?)
+                ''', (project_name, file_name, file_hash))
+
+        # Count the new chunks in the catalog, per file and once for the project
+        new_per_file = Counter(row[2] for row in rows if row[0] not in existing)
+        cursor.executemany('''
+            INSERT INTO files (project_name, file_name, upload_date, chunk_count, unscanned_count) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(project_name, file_name) DO UPDATE
+            SET chunk_count = chunk_count + excluded.chunk_count, unscanned_count = unscanned_count + excluded.unscanned_count
+        ''', [(project_name, file_name, upload_date, count, count) for file_name, count in new_per_file.items()])
+        new_count = sum(new_per_file.values())
+        if new_count:
+            cursor.execute('''
+                INSERT INTO projects (project_name, upload_date, chunk_count, unscanned_count) VALUES (?, ?, ?, ?)
+                ON CONFLICT(project_name) DO UPDATE
+                SET chunk_count = chunk_count + excluded.chunk_count, unscanned_count = unscanned_count + excluded.unscanned_count
+            ''', (project_name, upload_date, new_count, new_count))
         conn.commit()
         conn.close()
 
+        inserted = [(chunk_id, embedding) for chunk_id, embedding in zip(ids, embeddings) if chunk_id not in existing]
+        logger.info(f"Inserted {len(inserted)} chunks for project: {project_name}, {len(existing)} already stored")
+        if self.vector_store is not None:
+            self.vector_store.append(project_name, inserted)
+        if self.index_cache is not None:
+            self.index_cache.add_chunks(project_name, inserted)
+        return len(inserted)
+
+    def insert_chunks_stream(self, project_name, chunks, batch_size: int = None) -> int:
+        """
+        Insert chunks from an iterable (e.g. FileHandler.iter_chunks()) in batches of `batch_size`.
+
+        Every batch is committed on its own, so memory stays bounded and the chunks inserted before
+        a failure are kept. Returns the number of chunks that were saved.
+
+        The batch size defaults to the INSERT_BATCH_SIZE environment variable.
+        """
+        batch_size = batch_size or int(os.getenv("INSERT_BATCH_SIZE", "1000"))
+        total = 0
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                self.insert_chunks(project_name, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.insert_chunks(project_name, batch)
+            total += len(batch)
+        logger.info(f"Inserted {total} chunks for project: {project_name}")
+        return total
+
     def get_chunks_by_project_and_file(self, project_name, file_name):
         logger.info(f"Fetching chunks for project: {project_name}, file: {file_name}")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
-        # Now also selecting `distance`
+        # Best score per keyword for every chunk of the file that has hits
         cursor.execute('''
-                       SELECT chunk_text, page_number, keyword, distance
-                       FROM file_chunks
-                       WHERE project_name = ?
-                         AND file_name = ?
-                         AND keyword IS NOT NULL
-                         AND keyword != ''
+                       SELECT f.chunk_text, f.page_number, h.keyword, MAX(h.score)
+                       FROM file_chunks f
+                       JOIN chunk_hits h ON h.chunk_id = f.chunk_id
+                       WHERE f.project_name = ?
+                         AND f.file_name = ?
+                       GROUP BY f.chunk_text, f.page_number, h.keyword
+                       ORDER BY MIN(f.page_number), MIN(f.chunk_index), MIN(f.rowid), h.keyword
                        ''', (project_name, file_name))
 
         rows = cursor.fetchall()
@@ -97,40 +428,14 @@ class ChunkDatabase:
 
         # Group keywords+distances by (chunk_text, page_number)
         grouped = {}
-
-        for chunk_text, page_number, keyword, distance in rows:
-            key = (chunk_text, page_number)
-            if key not in grouped:
-                grouped[key] = set()
-
-            if keyword:
-                try:
-                    parsed_keywords = ast.literal_eval(keyword)
-                except Exception as e:
-                    logger.warning(f"Failed to parse keyword: {keyword}, error: {e}")
-                    parsed_keywords = [keyword.strip()]
-
-                try:
-                    parsed_distances = ast.literal_eval(distance) if distance else None
-                except Exception as e:
-                    logger.warning(f"Failed to parse distance: {distance}, error: {e}")
-                    parsed_distances = None
-
-                if (isinstance(parsed_keywords, list) and
-                        isinstance(parsed_distances, list) and
-                        len(parsed_keywords) == len(parsed_distances)):
-                    for kw, dist in zip(parsed_keywords, parsed_distances):
-                        grouped[key].add((kw.strip(), float(dist)))
-                else:
-                    dist_val = float(distance) if distance else 1.0
-                    for kw in parsed_keywords:
-                        grouped[key].add((kw.strip(), dist_val))
+        for chunk_text, page_number, keyword, score in rows:
+            grouped.setdefault((chunk_text, page_number), []).append([keyword, round(score, 4)])
 
         results = [
             {
                 "text": chunk_text,
                 "page": page_number,
-                "keywords": [[kw, round(dist, 4)] for kw, dist in sorted(keywords)]
+                "keywords": keywords
             }
             for (chunk_text, page_number), keywords in grouped.items()
         ]
@@ -141,97 +446,281 @@ class ChunkDatabase:
 
     def get_embeddings_by_project(self, project_name: str) -> List[Tuple[str, np.ndarray]]:
         logger.info(f"Fetching embeddings for project: {project_name}")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT chunk_id, embedding
+            SELECT chunk_id, embedding, embedding_dtype
             FROM file_chunks WHERE project_name = ?
         ''', (project_name,))
         rows = cursor.fetchall()
         conn.close()
-        embeddings = [(chunk_id, np.frombuffer(embedding_blob, dtype=np.float32)) for chunk_id, embedding_blob in rows]
+        embeddings = [(chunk_id, decode_embedding(embedding_blob, dtype)) for chunk_id, embedding_blob, dtype in rows]
         #logger.info(f"Fetched {type(embeddings)} embeddings for project '{project_name}'")
         return embeddings
     
-    def add_keyword_and_distance(self, chunk_id: str, query: str, distance: float):
-        #print(f"[DEBUG] Entering add_keyword_and_distance for chunk {chunk_id}")
+    def count_chunks(self, project_name: str) -> int:
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM file_chunks WHERE project_name = ?", (project_name,))
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
 
-        conn = sqlite3.connect(self.db_path)
+    def get_project_state(self, project_name: str) -> Tuple[int, str]:
+        """
+        (number of chunks, ID of the newest chunk) of a project, (0, None) when it is empty.
+        An index with as many vectors that contains the newest chunk is up to date with the database.
+        """
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute("SELECT chunk_id FROM file_chunks WHERE chunk_id = ?", (chunk_id,))
-        result = cursor.fetchone()
-        #print(f"DEBUG: Checking if chunk_id exists — {chunk_id} => {result}")
+        cursor.execute("SELECT COUNT(*), MAX(rowid) FROM file_chunks WHERE project_name = ?", (project_name,))
+        count, last_rowid = cursor.fetchone()
+        last_id = None
+        if last_rowid is not None:
+            last_id = cursor.execute("SELECT chunk_id FROM file_chunks WHERE rowid = ?", (last_rowid,)).fetchone()[0]
+        conn.close()
+        return count, last_id
 
-        if result is None:
-            print(f"[WARNING] Chunk ID '{chunk_id}' not found in the database.")
-        else:
-            # Update the row with matching chunk_id
-            cursor.execute('''
-            UPDATE file_chunks
-            SET keyword = ?, distance = ?
-            WHERE chunk_id = ?
-            ''', (query, distance, chunk_id))
-        #logger.info(f"Updated chunk {chunk_id} with keyword '{query}' and distance {distance}")
+    def get_file_hashes(self, project_name: str, file_names: List[str]) -> Dict[str, str]:
+        """Content hash of each stored file of a project, from its latest upload: {file_name: file_hash}."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        hashes = {}
+        for i in range(0, len(file_names), 500):
+            batch = file_names[i:i + 500]
+            # With MAX(rowid), SQLite takes the bare file_hash from the newest row of each file
+            cursor.execute(f'''
+                SELECT file_name, file_hash, MAX(rowid) FROM file_chunks
+                WHERE project_name = ? AND file_name IN ({','.join('?' for _ in batch)}) AND file_hash IS NOT NULL
+                GROUP BY file_name
+            ''', [project_name] + batch)
+            hashes.update((file_name, file_hash) for file_name, file_hash, _ in cursor.fetchall())
+        conn.close()
+        return hashes
+
+    def iter_chunk_texts(self, project_name: str, batch_size: int = 1000):
+        """Yield the chunk texts of a project, fetched in batches."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT chunk_text FROM file_chunks WHERE project_name = ?", (project_name,))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for (chunk_text,) in rows:
+                    yield chunk_text or ""
+        finally:
+            conn.close()
+
+    def get_vectors_by_project(self, project_name: str) -> Tuple[List[str], np.ndarray]:
+        """
+        Chunk IDs and an (n, d) matrix of their normalized vectors, to build a FaissIndex from.
+
+        With a vector store the project's memory-mapped file is returned. It is (re)built from the
+        embeddings in SQLite when it is missing or doesn't hold as many chunks as the database,
+        e.g. for projects stored before the vector store existed.
+        """
+        if self.vector_store is None:
+            embeddings = self.get_embeddings_by_project(project_name)
+            if not embeddings:
+                return [], np.empty((0, 0), dtype=np.float32)
+            return [chunk_id for chunk_id, _ in embeddings], normalize_rows(np.array([embedding for _, embedding in embeddings]))
+
+        loaded = self.vector_store.load(project_name)
+        if loaded is not None and len(loaded[0]) == self.count_chunks(project_name):
+            return loaded
+
+        logger.info(f"Rebuilding the vector store of project '{project_name}' from the database")
+        self.vector_store.write(project_name, self.get_embeddings_by_project(project_name))
+        return self.vector_store.load(project_name) or ([], np.empty((0, 0), dtype=np.float32))
+
+    def has_other_version(self, project_name: str, file_name: str, file_hash: str) -> bool:
+        """True when the project holds `file_name` with other content, e.g. before a revised file replaces it."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM file_chunks
+            WHERE project_name = ? AND file_name = ? AND file_hash IS NOT ?
+            LIMIT 1
+        ''', (project_name, file_name, file_hash))
+        found = cursor.fetchone() is not None
+        conn.close()
+        return found
+
+    def has_file_version(self, project_name: str, file_name: str, file_hash: str) -> bool:
+        """True when the project holds all chunks of `file_name` with exactly this content."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM file_versions
+            WHERE project_name = ? AND file_name = ? AND file_hash = ?
+        ''', (project_name, file_name, file_hash))
+        found = cursor.fetchone() is not None
+        conn.close()
+        return found
+
+    def has_file_hash(self, file_hash: str) -> bool:
+        """True when all chunks of a file with this content are stored, in any project."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM file_versions WHERE file_hash = ? LIMIT 1", (file_hash,))
+        found = cursor.fetchone() is not None
+        conn.close()
+        return found
+
+    def get_chunks_by_file_hash(self, file_hash: str) -> List[Dict]:
+        """Chunks and embeddings of one complete earlier upload of a file content, in their original order."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT chunk_text, page_number, chunk_hash, embedding, embedding_dtype
+            FROM file_chunks
+            WHERE (project_name, file_name) = (
+                SELECT project_name, file_name FROM file_versions WHERE file_hash = ? LIMIT 1
+            ) AND file_hash = ?
+            ORDER BY chunk_index, rowid
+        ''', (file_hash, file_hash))
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            {
+                "file_hash": file_hash,
+                "chunk_hash": chunk_hash,
+                "content": chunk_text,
+                "embedding": decode_embedding(embedding_blob, dtype),
+                "metadata": {"page": page_number, "chunk_index": chunk_index}
+            }
+            for chunk_index, (chunk_text, page_number, chunk_hash, embedding_blob, dtype) in enumerate(rows)
+        ]
+
+    def get_embeddings_by_chunk_hashes(self, chunk_hashes: List[str], batch_size: int = 500) -> Dict[str, np.ndarray]:
+        """Embeddings of already stored chunks with these text hashes: {chunk_hash: embedding}."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        unique = list(set(chunk_hashes))
+        embeddings = {}
+        for i in range(0, len(unique), batch_size):
+            batch = unique[i:i + batch_size]
+            cursor.execute(f'''
+                SELECT chunk_hash, embedding, embedding_dtype
+                FROM file_chunks
+                WHERE chunk_hash IN ({','.join('?' for _ in batch)})
+            ''', batch)
+            for chunk_hash, embedding_blob, dtype in cursor.fetchall():
+                embeddings[chunk_hash] = decode_embedding(embedding_blob, dtype)
+        conn.close()
+        return embeddings
+
+    def add_keyword_and_distance(self, chunk_id: str, query: str, distance: float):
+        """Save a single hit. Searches should use add_keyword_hits to write all their hits at once."""
+        self.add_keyword_hits({chunk_id: {"queries": [query], "distances": [distance]}})
+
+    def _parse_hits(self, keyword_str, distance_str) -> List[Tuple[str, float]]:
+        """Parse the stringified keyword and distance lists of the legacy file_chunks columns into (keyword, distance) pairs."""
+        try:
+            keywords = ast.literal_eval(keyword_str) if keyword_str else []
+        except Exception:
+            keywords = [keyword_str.strip()]
+        if not isinstance(keywords, list):
+            keywords = [keywords]
+
+        try:
+            distances = ast.literal_eval(distance_str) if isinstance(distance_str, str) and distance_str else distance_str
+        except Exception:
+            distances = None
+        if not isinstance(distances, list) or len(distances) != len(keywords):
+            # Distance is a single float or missing, assign it to all keywords
+            dist_val = float(distances) if isinstance(distances, (int, float)) else 1.0
+            distances = [dist_val] * len(keywords)
+
+        return [(str(kw).strip(), float(dist)) for kw, dist in zip(keywords, distances)]
+
+    def _migrate_legacy_hits(self, cursor):
+        """Move hits stored as stringified lists in file_chunks.keyword/distance into chunk_hits."""
+        cursor.execute('''
+            SELECT chunk_id, keyword, distance
+            FROM file_chunks
+            WHERE keyword IS NOT NULL AND keyword != ''
+        ''')
+        rows = cursor.fetchall()
+        if not rows:
+            return
+
+        hits = []
+        for chunk_id, keyword_str, distance_str in rows:
+            for keyword, score in self._parse_hits(keyword_str, distance_str):
+                if keyword:
+                    hits.append((chunk_id, keyword, score, "legacy"))
+        cursor.executemany(self._UPSERT_HIT, hits)
+        cursor.execute("UPDATE file_chunks SET keyword = NULL, distance = NULL WHERE keyword IS NOT NULL")
+        logger.info(f"Migrated {len(hits)} hits of {len(rows)} chunks to the chunk_hits table")
+
+    # A keyword found again by the same source keeps its highest score
+    _UPSERT_HIT = '''
+        INSERT INTO chunk_hits (chunk_id, keyword, score, source)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(chunk_id, keyword, source) DO UPDATE SET score = MAX(score, excluded.score)
+    '''
+
+    @retry_on_busy()
+    def add_keyword_hits(self, hits: Dict[str, Dict[str, list]], source: str = "semantic"):
+        """
+        Save all hits of one search in a single transaction.
+
+        Args:
+            hits: {chunk_id: {"queries": [...], "distances": [...]}}, as returned by FaissIndex.f_search.
+            source: What produced the hits, "semantic" for the FAISS search.
+
+        Hits are merged with the ones already stored: a keyword that is found again keeps its highest score.
+        """
+        if not hits:
+            return
+
+        rows = [
+            (str(chunk_id), query, float(distance), source)
+            for chunk_id, data in hits.items()
+            for query, distance in zip(data["queries"], data["distances"])
+        ]
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany(self._UPSERT_HIT, rows)
         conn.commit()
         conn.close()
+        logger.info(f"Saved {len(rows)} {source} hits for {len(hits)} chunks")
 
     def get_filename(self, project_name):
         logger.info(f"Fetching filenames and keywords for project: {project_name}")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
+        # Every file of the project with the best score per keyword over its scanned chunks
         cursor.execute('''
-                       SELECT file_name, keyword, scanned, distance
-                       FROM file_chunks
-                       WHERE project_name = ?
+                       SELECT f.file_name, h.keyword, MAX(h.score)
+                       FROM file_chunks f
+                       LEFT JOIN chunk_hits h ON h.chunk_id = f.chunk_id AND f.scanned = 1
+                       WHERE f.project_name = ?
+                       GROUP BY f.file_name, h.keyword
+                       ORDER BY (SELECT MIN(rowid) FROM file_chunks WHERE project_name = f.project_name AND file_name = f.file_name)
                        ''', (project_name,))
 
         rows = cursor.fetchall()
         conn.close()
 
         grouped = {}
+        for file_name, keyword, score in rows:
+            keywords = grouped.setdefault(file_name, [])
+            if keyword is not None:
+                keywords.append([keyword, round(score, 4)])
 
-        for file_name, keyword, scanned, distance in rows:
-            if file_name not in grouped:
-                grouped[file_name] = set()
-
-            if scanned == 0:
-                # No keywords
-                continue
-            else:
-                if keyword and keyword.strip() != "":
-                    try:
-                        # Parse keyword string into list
-                        parsed_keywords = ast.literal_eval(keyword)
-                    except Exception as e:
-                        logger.warning(f"Failed to parse keyword: {keyword}, error: {e}")
-                        parsed_keywords = [keyword.strip()]  # fallback
-
-                    try:
-                        # Parse distance, might be list or float string
-                        parsed_distances = ast.literal_eval(distance) if distance else None
-                    except Exception as e:
-                        logger.warning(f"Failed to parse distance: {distance}, error: {e}")
-                        parsed_distances = None
-
-                    if (isinstance(parsed_keywords, list) and
-                            isinstance(parsed_distances, list) and
-                            len(parsed_keywords) == len(parsed_distances)):
-                        for kw, dist in zip(parsed_keywords, parsed_distances):
-                            grouped[file_name].add((kw.strip(), float(dist)))
-                    else:
-                        # Distance is single float or None, assign to all keywords
-                        dist_val = float(distance) if distance else 1.0
-                        for kw in parsed_keywords:
-                            grouped[file_name].add((kw.strip(), dist_val))
-
-        results = []
-        for file_name, keyword_set in grouped.items():
-            formatted_keywords = [[kw, round(score, 4)] for kw, score in keyword_set]
-            results.append({
+        results = [
+            {
                 "Document Name": file_name,
-                "Keywords": formatted_keywords
-            })
+                "Keywords": keywords
+            }
+            for file_name, keywords in grouped.items()
+        ]
 
         logger.info(f"Fetched {len(results)} results for project: {project_name}")
         return results
@@ -239,12 +728,12 @@ class ChunkDatabase:
 
     def get_projects(self):
         logger.info(f"Searching for existing projects")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT DISTINCT project_name
-            FROM  file_chunks
-            WHERE project_name IS NOT NULL AND project_name != ''
+            SELECT project_name
+            FROM projects
+            WHERE chunk_count > 0
         ''')
         rows = cursor.fetchall()
         conn.close()
@@ -252,253 +741,397 @@ class ChunkDatabase:
         logger.info(f"Fetched {len(projects)} unique projects")
         return projects
 
+    def get_project_overview(self) -> List[Dict]:
+        """
+        Every project with its first upload date and scan status, from the catalog in one read.
+        A project is scanned when none of its chunks is waiting for a scan.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT project_name, upload_date, unscanned_count, scanned_time, chunk_count, hit_count
+            FROM projects
+            WHERE chunk_count > 0
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            {
+                "project_name": project_name,
+                "upload_date": upload_date,
+                "scanned": unscanned_count == 0,
+                "scanned_time": scanned_time,
+                "chunk_count": chunk_count,
+                "hit_count": hit_count
+            }
+            for project_name, upload_date, unscanned_count, scanned_time, chunk_count, hit_count in rows
+        ]
+
+    @retry_on_busy()
     def reset_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.execute("DELETE FROM chunk_hits")
         cursor.execute("DELETE FROM file_chunks")
+        cursor.execute("DELETE FROM files")
+        cursor.execute("DELETE FROM projects")
+        cursor.execute("DELETE FROM keyword_scans")
+        cursor.execute("DELETE FROM file_versions")
         conn.commit()
         conn.close()
 
+        if self.vector_store is not None:
+            self.vector_store.clear()
+        if self.index_cache is not None:
+            self.index_cache.clear()
+
     def get_project_time_and_status(self, project_name):
         logger.info(f"Checking upload time and scan status for project: {project_name}")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
-        # Get one upload_date (for example, the earliest upload_date for the project)
+        # The earliest upload_date of the project and the number of chunks not scanned yet
         cursor.execute("""
-            SELECT MIN(upload_date)
-            FROM file_chunks
+            SELECT upload_date, unscanned_count
+            FROM projects
             WHERE project_name = ?
         """, (project_name,))
-        upload_date_row = cursor.fetchone()
-        upload_date = upload_date_row[0] if upload_date_row else None
-
-        # Check if any file chunk in the project is not scanned (scanned == 0)
-        cursor.execute("""
-            SELECT EXISTS(
-                SELECT 1 FROM file_chunks WHERE project_name = ? AND scanned = 0
-            )
-        """, (project_name,))
-        any_not_scanned_row = cursor.fetchone()
-        any_not_scanned = bool(any_not_scanned_row[0]) if any_not_scanned_row else False
+        row = cursor.fetchone()
         conn.close()
+        upload_date = row[0] if row else None
         # Project scanned status: True if all scanned, False if any not scanned
-        project_scanned = not any_not_scanned
+        project_scanned = not (row and row[1] > 0)
         logger.info(f"Project '{project_name}' upload date: {upload_date}, scanned status: {project_scanned}")
         return upload_date, project_scanned
 
+    def get_upload_time_project(self, project_name):
+        """The earliest upload date of a project, None for an unknown project."""
+        return self.get_project_time_and_status(project_name)[0]
+
+    @retry_on_busy()
     def delete_project(self, project_name):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM chunk_hits
+            WHERE chunk_id IN (SELECT chunk_id FROM file_chunks WHERE project_name = ?)
+        """, (project_name,))
         cursor.execute("""
             DELETE FROM file_chunks
             WHERE project_name = ?
         """, (project_name,))
+        cursor.execute("DELETE FROM files WHERE project_name = ?", (project_name,))
+        cursor.execute("DELETE FROM projects WHERE project_name = ?", (project_name,))
+        cursor.execute("DELETE FROM keyword_scans WHERE project_name = ?", (project_name,))
+        cursor.execute("DELETE FROM file_versions WHERE project_name = ?", (project_name,))
+        self._clamp_watermarks(cursor)
         conn.commit()
         conn.close()
 
+        if self.vector_store is not None:
+            self.vector_store.drop_project(project_name)
+        if self.index_cache is not None:
+            self.index_cache.drop_project(project_name)
+
+    @retry_on_busy()
     def delete_file(self, project_name, file_name):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.execute("""
+            SELECT chunk_id FROM file_chunks
+            WHERE project_name = ? AND file_name = ?
+        """, (project_name, file_name))
+        chunk_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            DELETE FROM chunk_hits
+            WHERE chunk_id IN (SELECT chunk_id FROM file_chunks WHERE project_name = ? AND file_name = ?)
+        """, (project_name, file_name))
         cursor.execute("""
             DELETE FROM file_chunks
             WHERE project_name = ? AND file_name = ?
         """, (project_name, file_name))
+
+        # Take the file's counts off the project, its hits were subtracted by the chunk_hits trigger
+        cursor.execute("SELECT chunk_count, unscanned_count FROM files WHERE project_name = ? AND file_name = ?", (project_name, file_name))
+        counts = cursor.fetchone() or (0, 0)
+        cursor.execute("""
+            UPDATE projects
+            SET chunk_count = chunk_count - ?, unscanned_count = unscanned_count - ?
+            WHERE project_name = ?
+        """, (*counts, project_name))
+        cursor.execute("DELETE FROM files WHERE project_name = ? AND file_name = ?", (project_name, file_name))
+        cursor.execute("DELETE FROM file_versions WHERE project_name = ? AND file_name = ?", (project_name, file_name))
+        cursor.execute("""
+            UPDATE projects
+            SET (upload_date, scanned_time) = (SELECT MIN(upload_date), MAX(scanned_time) FROM files WHERE project_name = ?)
+            WHERE project_name = ?
+        """, (project_name, project_name))
+        cursor.execute("DELETE FROM projects WHERE project_name = ? AND chunk_count <= 0", (project_name,))
+        self._clamp_watermarks(cursor)
         conn.commit()
         conn.close()
 
-    def mark_project_chunks_scanned(self, project_name):
-        conn = sqlite3.connect(self.db_path)
+        if self.vector_store is not None:
+            self.vector_store.remove(project_name, chunk_ids)
+        if self.index_cache is not None:
+            self.index_cache.remove_chunks(project_name, chunk_ids)
+
+    @retry_on_busy()
+    def mark_project_chunks_scanned(self, project_name, up_to: int = None):
+        """
+        Mark the unscanned chunks of a project as scanned, only those up to rowid `up_to` when given
+        (chunks added while a search ran stay unscanned). Chunks that were scanned before are not touched.
+        """
+        conn = self._connect()
         cursor = conn.cursor()
         scanned_time = datetime.now(timezone.utc).isoformat()
+        up_to = up_to if up_to is not None else self._last_rowid(cursor)
         cursor.execute("""
-            UPDATE file_chunks
-            SET scanned = 1, scanned_time = ?
-            WHERE project_name = ?
-        """, (scanned_time, project_name,))
+            SELECT file_name, COUNT(*)
+            FROM file_chunks
+            WHERE project_name = ? AND scanned = 0 AND rowid <= ?
+            GROUP BY file_name
+        """, (project_name, up_to))
+        per_file = cursor.fetchall()
+        if per_file:
+            cursor.execute("""
+                UPDATE file_chunks
+                SET scanned = 1, scanned_time = ?
+                WHERE project_name = ? AND scanned = 0 AND rowid <= ?
+            """, (scanned_time, project_name, up_to))
+            cursor.executemany("""
+                UPDATE files SET unscanned_count = unscanned_count - ?, scanned_time = ?
+                WHERE project_name = ? AND file_name = ?
+            """, [(count, scanned_time, project_name, file_name) for file_name, count in per_file])
+            cursor.execute("""
+                UPDATE projects SET unscanned_count = unscanned_count - ?, scanned_time = ?
+                WHERE project_name = ?
+            """, (sum(count for _, count in per_file), scanned_time, project_name))
         conn.commit()
         conn.close()
+        logger.info(f"Marked {sum(count for _, count in per_file)} chunks of project '{project_name}' as scanned")
+
+    def _last_rowid(self, cursor) -> int:
+        return cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM file_chunks").fetchone()[0]
+
+    def get_last_chunk_rowid(self) -> int:
+        """The rowid of the newest chunk. A search records it as its watermark, see get_scan_watermarks()."""
+        conn = self._connect()
+        last = self._last_rowid(conn.cursor())
+        conn.close()
+        return last
+
+    def _clamp_watermarks(self, cursor):
+        """
+        After a delete, lower the watermarks above the newest remaining chunk. SQLite gives a new row
+        the highest rowid + 1, so without this the chunks inserted after deleting the newest ones could
+        get rowids below a watermark and never be searched.
+        """
+        cursor.execute("UPDATE keyword_scans SET watermark = ?1 WHERE watermark > ?1", (self._last_rowid(cursor),))
+
+    def get_scan_watermarks(self, project_name: str, keywords: List[str], threshold: float) -> Dict[str, int]:
+        """
+        {keyword: watermark}: the chunks of the project up to this rowid were already searched for the
+        keyword, with this threshold or a lower one (a lower threshold finds a superset of the hits).
+        0 for keywords that were never searched.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        watermarks = {}
+        for keyword in keywords:
+            cursor.execute('''
+                SELECT COALESCE(MAX(watermark), 0)
+                FROM keyword_scans
+                WHERE project_name = ? AND keyword = ? AND threshold <= ?
+            ''', (project_name, keyword, threshold))
+            watermarks[keyword] = cursor.fetchone()[0]
+        conn.close()
+        return watermarks
+
+    @retry_on_busy()
+    def set_scan_watermarks(self, project_name: str, keywords: List[str], threshold: float, watermark: int):
+        """Record that all chunks of the project up to rowid `watermark` were searched for these keywords."""
+        scanned_time = datetime.now(timezone.utc).isoformat()
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO keyword_scans (project_name, keyword, threshold, watermark, scanned_time) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(project_name, keyword, threshold) DO UPDATE
+            SET watermark = MAX(watermark, excluded.watermark), scanned_time = excluded.scanned_time
+        ''', [(project_name, keyword, threshold, watermark, scanned_time) for keyword in set(keywords)])
+        conn.commit()
+        conn.close()
+
+    def get_chunks_between(self, project_name: str, after: int, up_to: int) -> List[Tuple[int, str]]:
+        """(rowid, chunk_id) of the project's chunks with after < rowid <= up_to, oldest first: the ones a keyword still has to be searched in."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT rowid, chunk_id
+            FROM file_chunks
+            WHERE rowid > ? AND rowid <= ? AND project_name = ?
+            ORDER BY rowid
+        ''', (after, up_to, project_name))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
 
     def get_files_scanned_status_and_time(self, project_name):
         """
         For each file in a project, check if scanned, and if yes, get the latest scanned time.
-        Returns a list of dicts: [{'file_name': ..., 'scanned': bool, 'scanned_time': str or None}, ...]
+        Returns a list of dicts: [{'file_name': ..., 'scanned': bool, 'scanned_time': str or None,
+        'upload_date': str, 'chunk_count': int, 'hit_count': int}, ...]
+
+        A file is scanned when none of its chunks is waiting for a scan.
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT file_name,
-                   MAX(CASE WHEN scanned = 1 THEN upload_date ELSE NULL END) AS scanned_time,
-                   MAX(scanned) as is_scanned
-            FROM file_chunks
+            SELECT file_name, scanned_time, unscanned_count, upload_date, chunk_count, hit_count
+            FROM files
             WHERE project_name = ?
-            GROUP BY file_name
         ''', (project_name,))
 
         rows = cursor.fetchall()
         conn.close()
 
         results = []
-        for file_name, scanned_time, is_scanned in rows:
+        for file_name, scanned_time, unscanned_count, upload_date, chunk_count, hit_count in rows:
             results.append({
                 "file_name": file_name,
-                "scanned": bool(is_scanned),
-                "scanned_time": scanned_time if scanned_time else None
+                "scanned": unscanned_count == 0,
+                "scanned_time": scanned_time if scanned_time else None,
+                "upload_date": upload_date,
+                "chunk_count": chunk_count,
+                "hit_count": hit_count
             })
         return results
 
     def get_new_embeddings_by_project(self, project_name: str) -> List[Tuple[str, np.ndarray]]:
         logger.info(f"Fetching embeddings for project: {project_name}, not scanned")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT chunk_id, embedding
+            SELECT chunk_id, embedding, embedding_dtype
             FROM file_chunks WHERE project_name = ? AND scanned == 0
         ''', (project_name,))
         rows = cursor.fetchall()
         conn.close()
-        embeddings = [(chunk_id, np.frombuffer(embedding_blob, dtype=np.float32)) for chunk_id, embedding_blob in rows]
+        embeddings = [(chunk_id, decode_embedding(embedding_blob, dtype)) for chunk_id, embedding_blob, dtype in rows]
         return embeddings
 
+    def get_new_chunk_ids_by_project(self, project_name: str) -> List[str]:
+        """IDs of the chunks that have not been scanned yet, used to restrict a search on the cached index."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT chunk_id
+            FROM file_chunks WHERE project_name = ? AND scanned == 0
+        ''', (project_name,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+
     def get_all_retrieved_keywords_and_distances_by_project(self, project_name):
         logger.info(f"Getting separate keyword and distance lists for project: {project_name}")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute("""
-                       SELECT DISTINCT keyword, distance
-                       FROM file_chunks
-                       WHERE project_name = ?
-                         AND keyword IS NOT NULL
-                         AND keyword != ''
-                         AND distance IS NOT NULL
-                         AND distance != ''
+                       SELECT h.keyword, MAX(h.score)
+                       FROM chunk_hits h
+                       JOIN file_chunks f ON f.chunk_id = h.chunk_id
+                       WHERE f.project_name = ?
+                       GROUP BY h.keyword
+                       ORDER BY MIN(h.rowid)
                        """, (project_name,))
         rows = cursor.fetchall()
         conn.close()
 
-        keywords_list = []
-        distances_list = []
-
-        seen = set()
-
-        for keyword_str, distance_str in rows:
-            try:
-                keywords = ast.literal_eval(keyword_str)
-                distances = ast.literal_eval(distance_str)
-            except Exception as e:
-                logger.warning(f"Skipping row due to parsing error: {e}")
-                continue
-
-            if isinstance(keywords, list) and isinstance(distances, list) and len(keywords) == len(distances):
-                for word, score in zip(keywords, distances):
-                    word = word.strip()
-                    if word not in seen:
-                        seen.add(word)
-                        keywords_list.append(word)
-                        distances_list.append(float(score))
-
+        keywords_list = [keyword for keyword, _ in rows]
+        distances_list = [float(score) for _, score in rows]
         return keywords_list, distances_list
 
     def get_all_retrieved_keywords_by_project(self, project_name):
         logger.info(f"Getting keywords for project: {project_name}")
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute("""
-                       SELECT DISTINCT keyword
-                       FROM file_chunks
-                       WHERE project_name = ?
-                         AND keyword IS NOT NULL
-                         AND keyword != ''
+                       SELECT h.keyword
+                       FROM chunk_hits h
+                       JOIN file_chunks f ON f.chunk_id = h.chunk_id
+                       WHERE f.project_name = ?
+                       GROUP BY h.keyword
+                       ORDER BY MIN(h.rowid)
                        """, (project_name,))
         rows = cursor.fetchall()
         conn.close()
-        keywords_found = [row[0].strip() for row in rows if row[0] and row[0].strip()]
-
-        all_words = []
-
-        for item in keywords_found:
-            # Safely parse the string to a list object
-            words_list = ast.literal_eval(item)
-            # Clean each word and extend all_words
-            cleaned_words = [word.strip() for word in words_list]
-            all_words.extend(cleaned_words)
-
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_keywords = []
-        for keyword in all_words:
-            if keyword not in seen:
-                seen.add(keyword)
-                unique_keywords.append(keyword)
-        return unique_keywords
+        return [row[0] for row in rows]
 
-    def add_exact_keyword_matches_to_chunks(self, keyword: str, project_name: str):
-        conn = sqlite3.connect(self.db_path)
+    @retry_on_busy()
+    def add_exact_keyword_matches_to_chunks(self, keyword: str, project_name: str, after: int = 0, up_to: int = None):
+        """Save an exact hit for every chunk containing the keyword, only chunks with after < rowid <= up_to when given."""
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute("""
-                       SELECT chunk_id, chunk_text, keyword, distance
-                       FROM file_chunks
-                       WHERE project_name = ?
-                       """, (project_name,))
-        rows = cursor.fetchall()
-
-        for chunk_id, text, keyword_str, distance_str in rows:
-            if keyword.lower() in text.lower():  # Case-insensitive match
-
-                # Parse existing keywords
-                try:
-                    keywords = ast.literal_eval(keyword_str) if keyword_str else []
-                except Exception:
-                    keywords = []
-                if not isinstance(keywords, list):
-                    keywords = [keywords]
-
-                # Parse existing distances
-                try:
-                    distances = ast.literal_eval(distance_str) if distance_str else []
-                except Exception:
-                    distances = []
-                if not isinstance(distances, list):
-                    distances = [distances]
-
-                # Check if keyword exists in list
-                if keyword in keywords:
-                    idx = keywords.index(keyword)
-                    if distances[idx] < 0.99:
-                        # Promote to exact match by updating distance
-                        distances[idx] = 0.99
-                else:
-                    # Add new exact match
-                    keywords.append(keyword)
-                    distances.append(0.99)
-
-                cursor.execute('''
-                               UPDATE file_chunks
-                               SET keyword  = ?,
-                                   distance = ?
-                               WHERE chunk_id = ?
-                               ''', (str(keywords), str(distances), chunk_id))
+        up_to = up_to if up_to is not None else self._last_rowid(cursor)
+
+        if self._use_fts(keyword):
+            # Index lookup of the chunks containing the keyword
+            cursor.execute("""
+                           SELECT f.chunk_id
+                           FROM chunk_fts
+                           JOIN file_chunks f ON f.rowid = chunk_fts.rowid
+                           WHERE chunk_fts MATCH ?
+                             AND chunk_fts.rowid > ? AND chunk_fts.rowid <= ?
+                             AND f.project_name = ?
+                           """, (self._fts_phrase(keyword), after, up_to, project_name))
+            chunk_ids = [row[0] for row in cursor.fetchall()]
+        else:
+            cursor.execute("""
+                           SELECT chunk_id, chunk_text
+                           FROM file_chunks
+                           WHERE rowid > ? AND rowid <= ? AND project_name = ?
+                           """, (after, up_to, project_name))
+            needle = keyword.lower()
+            chunk_ids = [chunk_id for chunk_id, text in cursor.fetchall() if needle in text.lower()]  # Case-insensitive match
+
+        # An exact match scores 0.99, a higher semantic score for the same keyword still wins in MAX(score)
+        hits = [(chunk_id, keyword, 0.99, "exact") for chunk_id in chunk_ids]
+        cursor.executemany(self._UPSERT_HIT, hits)
         conn.commit()
         conn.close()
-        print(f"[INFO] Exact keyword '{keyword}' added to matching chunks.")
+        print(f"[INFO] Exact keyword '{keyword}' added to {len(hits)} matching chunks.")
 
 
     def get_files_with_keywords(self, keywords, project_name):
         if not keywords:
             raise ValueError("No retrieved keywords found for this project.") # in case no keywrods were found
 
-        conn = sqlite3.connect(self.db_path)
+        indexed = [kw for kw in keywords if self._use_fts(kw)]
+        scanned = [kw for kw in keywords if not self._use_fts(kw)]
+
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT DISTINCT file_name
-            FROM file_chunks
-            WHERE project_name = ?
-            AND ({' OR '.join(['LOWER(chunk_text) LIKE LOWER(?)' for _ in keywords])})
-        """, [project_name] + [f"%{kw}%" for kw in keywords])
-        rows = cursor.fetchall()
+        files = []
+        if indexed:
+            cursor.execute("""
+                SELECT DISTINCT f.file_name
+                FROM chunk_fts
+                JOIN file_chunks f ON f.rowid = chunk_fts.rowid
+                WHERE chunk_fts MATCH ?
+                AND f.project_name = ?
+            """, (" OR ".join(self._fts_phrase(kw) for kw in indexed), project_name))
+            files.extend(row[0] for row in cursor.fetchall())
+        if scanned:
+            cursor.execute(f"""
+                SELECT DISTINCT file_name
+                FROM file_chunks
+                WHERE project_name = ?
+                AND ({' OR '.join(['LOWER(chunk_text) LIKE LOWER(?)' for _ in scanned])})
+            """, [project_name] + [f"%{kw}%" for kw in scanned])
+            files.extend(row[0] for row in cursor.fetchall() if row[0] not in files)
         conn.close()
 
-        return [row[0] for row in rows]
+        return files
 
 if __name__ == "__main__":
     db = ChunkDatabase()  # This triggers init_db()
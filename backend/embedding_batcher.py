@@ -0,0 +1,82 @@
+import os
+import time
+import logging
+from typing import List, Dict, Any, Iterable, Iterator
+from constants import get_model
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Collects chunks across files and encodes them in batches of similar token length.
+
+    Encoding file by file gives tiny batches for small files and one large, unsorted batch for big
+    files. The batcher buffers up to `buffer_size` chunks from any number of files, sorts them by
+    token length so every batch pads to about the same length, and encodes `batch_size` chunks per
+    call. Chunks come back with an "embedding" key in the order they were added, so they are stored
+    in document order. Chunks that already have an embedding (reused or copied) keep their place and
+    are not encoded again.
+
+    add() and flush() are generators, the chunks are only encoded while they are consumed.
+    """
+
+    def __init__(self, model=None, batch_size: int = None, buffer_size: int = None):
+        self.model = model if model is not None else get_model()
+        self.batch_size = batch_size or int(os.getenv("EMBED_BATCH_SIZE", "64"))
+        self.buffer_size = buffer_size or int(os.getenv("EMBED_BUFFER_SIZE", str(self.batch_size * 16)))
+        self._pending = []
+
+        # Throughput counters
+        self.chunks_encoded = 0
+        self.encode_time = 0.0
+
+    def add(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Buffer chunks (dicts with a "content" key) and yield embedded chunks whenever the buffer is full."""
+        self._pending.extend(chunks)
+        while len(self._pending) >= self.buffer_size:
+            buffered = self._pending[:self.buffer_size]
+            self._pending = self._pending[self.buffer_size:]
+            yield from self._encode(buffered)
+
+    def flush(self) -> Iterator[Dict[str, Any]]:
+        """Encode and yield everything that is still buffered."""
+        buffered, self._pending = self._pending, []
+        yield from self._encode(buffered)
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]  # Character length is a fair proxy without a tokenizer
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def _encode(self, chunks: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        if not chunks:
+            return
+
+        missing = [chunk for chunk in chunks if chunk.get("embedding") is None]
+        if missing:
+            start = time.perf_counter()
+            lengths = self._token_lengths([chunk["content"] for chunk in missing])
+            ordered = [missing[i] for i in sorted(range(len(missing)), key=lengths.__getitem__)]
+
+            for i in range(0, len(ordered), self.batch_size):
+                batch = ordered[i:i + self.batch_size]
+                embeddings = self.model.encode([chunk["content"] for chunk in batch], batch_size=len(batch), convert_to_numpy=True)
+                for chunk, embedding in zip(batch, embeddings):
+                    chunk["embedding"] = embedding
+
+            elapsed = time.perf_counter() - start
+            self.chunks_encoded += len(ordered)
+            self.encode_time += elapsed
+            logger.info(f"Encoded {len(ordered)} chunks in {elapsed:.2f}s ({len(ordered) / elapsed if elapsed else 0:.1f} chunks/sec)")
+        yield from chunks  # Sorted for encoding only, handed on in their original order
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.chunks_encoded,
+            "seconds": round(self.encode_time, 3),
+            "chunks_per_sec": round(self.chunks_encoded / self.encode_time, 1) if self.encode_time else 0.0,
+            "batch_size": self.batch_size,
+        }
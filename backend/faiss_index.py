@@ -1,29 +1,65 @@
 import faiss
 import numpy as np
+import threading
 from typing import List, Tuple, Dict, Any
 from db import ChunkDatabase
 from constants import get_model
+from quantization import default_dtype
+from query_cache import encode_queries
 
 
 class FaissIndex:
-    def __init__(self, embeddings: List[Tuple[str, np.ndarray]], temperature: float):
+    def __init__(self, embeddings: List[Tuple[str, np.ndarray]], temperature: float, dtype: str = None, dimension: int = None):
         """Initialize the FaissIndex with embeddings mapped to integers.
 
         Args:
             embeddings: A list of tuples where each tuple contains an integer and a numpy array (embedding).
             temperature: A threshold for filtering results based on distance.
+            dtype: How vectors are held in memory: "float32" (exact), "float16" or "int8". Defaults to EMBEDDING_DTYPE.
+            dimension: Vector size of an index created without embeddings. Defaults to the encoder's.
         """
         self.temperature = temperature
-        self.embeddings = embeddings
-        self.encoder = get_model()  # Initialize the encoder model
-
-        self.vectors = np.array([embedding for _, embedding in embeddings])
-        self.vectors = self._normalize(self.vectors)
-
-        self.ids = [id_ for id_, _ in embeddings]  # Extract IDs from the embeddings
-        self.dimension = self.vectors.shape[1]
-        self.index = faiss.IndexFlatIP(self.dimension)  # Using L2 distance for simplicity
-        self._add()
+        self.dtype = dtype or default_dtype()
+
+        self.ids = []  # FAISS position -> chunk ID
+        self.id_to_pos = {}  # chunk ID -> FAISS position
+        self._lock = threading.RLock()  # The index is shared between requests by the ProjectIndexCache
+
+        if embeddings:
+            self.dimension = len(embeddings[0][1])
+        elif dimension:
+            self.dimension = dimension
+        else:
+            self.dimension = self.encoder.get_sentence_embedding_dimension()
+        self.index = self._build_index(self.dimension, self.dtype)
+        self.add(embeddings)
+
+    @classmethod
+    def from_vectors(cls, ids: List[str], vectors: np.ndarray, temperature: float, dtype: str = None) -> "FaissIndex":
+        """Build from an (n, d) matrix of normalized vectors, e.g. a VectorStore memmap, without per-row copies."""
+        index = cls([], temperature, dtype=dtype, dimension=vectors.shape[1] if vectors.ndim == 2 and vectors.shape[1] else None)
+        index._add_normalized(list(ids), vectors)
+        return index
+
+    @property
+    def encoder(self):
+        """The query encoder, only loaded when a text query is searched."""
+        return get_model()
+
+    @staticmethod
+    def _build_index(dimension: int, dtype: str) -> faiss.Index:
+        """Inner product on normalized vectors = cosine similarity, exact or on scalar-quantized codes."""
+        if dtype == "float32":
+            return faiss.IndexFlatIP(dimension)
+        if dtype == "float16":
+            return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        if dtype == "int8":
+            index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit_uniform, faiss.METRIC_INNER_PRODUCT)
+            # Components of a unit vector lie in [-1, 1]: a fixed range instead of one trained on the first
+            # vectors, so chunks added later are never clipped
+            index.train(np.array([[-1.0] * dimension, [1.0] * dimension], dtype=np.float32))
+            return index
+        raise ValueError(f"Unknown embedding dtype '{dtype}'")
 
     def _normalize(self, vectors: np.ndarray) -> np.ndarray:
         """
@@ -34,13 +70,47 @@ class FaissIndex:
             vectors = vectors.reshape(1, -1)  # Reshape to (1, n_features)
         return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
 
-    def _add(self):
-        """Add vectors to the index."""
-        self.index.add(self.vectors)
-        assert self.index.ntotal == len(self.ids), f"Index size mismatch: {self.index.ntotal} vs {len(self.ids)}"
+    def add(self, embeddings: List[Tuple[str, np.ndarray]]):
+        """Add (chunk_id, embedding) pairs to the index, skipping chunk IDs that are already indexed."""
+        new = [(id_, emb) for id_, emb in embeddings if id_ not in self.id_to_pos]
+        if not new:
+            return
+        vectors = self._normalize(np.array([emb for _, emb in new], dtype=np.float32))
+        self._add_normalized([id_ for id_, _ in new], vectors)
+
+    def _add_normalized(self, ids: List[str], vectors: np.ndarray):
+        if not ids:
+            return
+        with self._lock:
+            for id_ in ids:
+                self.id_to_pos[id_] = len(self.ids)
+                self.ids.append(id_)
+            self.index.add(np.ascontiguousarray(vectors, dtype=np.float32))  # FAISS copies the rows into its own storage
+            assert self.index.ntotal == len(self.ids), f"Index size mismatch: {self.index.ntotal} vs {len(self.ids)}"
+
+    def remove(self, chunk_ids: List[str]):
+        """Remove chunks from the index. FAISS compacts the remaining vectors, so positions are rebuilt."""
+        positions = {self.id_to_pos[id_] for id_ in chunk_ids if id_ in self.id_to_pos}
+        if not positions:
+            return
+        with self._lock:
+            self.index.remove_ids(np.array(sorted(positions), dtype=np.int64))
+            self.ids = [id_ for pos, id_ in enumerate(self.ids) if pos not in positions]
+            self.id_to_pos = {id_: pos for pos, id_ in enumerate(self.ids)}
+            assert self.index.ntotal == len(self.ids), f"Index size mismatch: {self.index.ntotal} vs {len(self.ids)}"
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.id_to_pos
+
+    def nbytes(self) -> int:
+        """Approximate memory used by the stored vectors."""
+        return self.index.ntotal * self.index.code_size
 
     def _vectorize_queries(self, queries: List[str]) -> np.ndarray:
-        vecs = self.encoder.encode(queries, convert_to_numpy=True)
+        vecs = encode_queries(queries)  # Keywords and synonyms repeat across searches
         return self._normalize(vecs)
         
     def _index_to_ids(self, indices):
@@ -55,59 +125,83 @@ class FaissIndex:
         return [self.ids[i] for i in indices]
          
 
-    def f_search(self, queries: List[str], db: ChunkDatabase) -> List[Dict[str, Any]]:
-        """Search for the k nearest neighbors of a query vector.
+    def _group_hits(self, queries: List[str], lims: np.ndarray, scores: np.ndarray, positions: np.ndarray, ids: List[str]) -> Dict[str, Dict[str, list]]:
+        """Group range search results per chunk: {chunk_id: {"queries": [...], "distances": [...]}}.
+
+        Sorting and splitting happen in NumPy, Python only loops once per matched chunk.
+        """
+        if lims[-1] == 0:
+            return {}  # No hits, the splitting below needs at least one
+        query_idx = np.repeat(np.arange(len(queries)), np.diff(lims).astype(np.int64))
+
+        # Sort by chunk position, keeping the query order within a chunk
+        order = np.lexsort((query_idx, positions))
+        positions = positions[order]
+        query_idx = query_idx[order]
+        scores = np.round(scores[order].astype(np.float64), 2)
+
+        starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+        ends = np.r_[starts[1:], len(positions)]
+        query_arr = np.asarray(queries, dtype=object)
+
+        chunk_query_dict = {}
+        for start, end in zip(starts, ends):
+            chunk_query_dict[ids[positions[start]]] = {
+                "queries": query_arr[query_idx[start:end]].tolist(),
+                "distances": scores[start:end].tolist(),
+            }
+        return chunk_query_dict
+
+    def f_search(self, queries: List[str], db: ChunkDatabase, temperature: float = None, chunk_ids: List[str] = None) -> Dict[str, Dict[str, list]]:
+        """Find every chunk whose similarity to a query is at least the threshold and save the hits.
+
+        Uses a FAISS range search, so only the hits above the threshold are returned by the index
+        instead of the full score matrix.
 
         Args:
             query: A list of query strings (keywords).
+            temperature: Overrides the threshold set at construction (the index is shared across scopes).
+            chunk_ids: Restrict the search to these chunks (e.g. the unscanned ones). None searches everything.
 
         Returns:
-            tuple: Distances and indices of the nearest neighbors.
+            dict: The matched chunk IDs with their queries and distances.
         """
 
         if not queries:
              raise ValueError("Queries must be a non-empty list of strings.")
 
-        k = len(self.vectors)  # Number of vectors in the index
         query_vector = self._vectorize_queries(queries)
 
         # print("[DEBUG] Norms of query vectors:", np.linalg.norm(query_vector, axis=1))
-        # print("[DEBUG] Norms of indexed vectors:", np.linalg.norm(self.vectors, axis=1)[:5])  # Show first 5
 
+        chunk_query_dict = self.range_search(query_vector, queries, temperature, chunk_ids)
+
+        db.add_keyword_hits(chunk_query_dict)  # One transaction for all hits
+        return chunk_query_dict
+
+    def range_search(self, query_vector: np.ndarray, queries: List[str], temperature: float = None, chunk_ids: List[str] = None) -> Dict[str, Dict[str, list]]:
+        """Range search with already normalized query vectors, `queries` are the labels of the rows. Saves nothing."""
+        temperature = self.temperature if temperature is None else temperature
 
         # Validate dimensionality
         if query_vector.shape[1] != self.dimension:
             raise ValueError(f"Query vector dimensionality ({query_vector.shape[1]}) does not match FAISS index dimensionality ({self.dimension}).")
 
-        distances, indices = self.index.search(query_vector, k)
+        # FAISS keeps inner products strictly greater than the radius, step just below the threshold to keep `>=`
+        radius = float(np.nextafter(np.float32(temperature), np.float32(-np.inf)))
 
-        # Dictionary to store chunk IDs and their corresponding queries
-        chunk_query_dict = {}
+        with self._lock:
+            params = None
+            if chunk_ids is not None:
+                selected = np.array([self.id_to_pos[id_] for id_ in chunk_ids if id_ in self.id_to_pos], dtype=np.int64)
+                if len(selected) == 0:
+                    return {}
+                params = faiss.SearchParameters()
+                params.sel = faiss.IDSelectorBatch(selected)
+            if self.index.ntotal == 0:
+                return {}
+
+            lims, scores, positions = self.index.range_search(query_vector, radius, params=params)
+            ids = self.ids  # Snapshot: remove() replaces the list rather than mutating it
 
-        # Iterate over each query and its corresponding distances and indices
-        for query_str, dist_list, idx_list in zip(queries, distances, indices):
-            for dist, idx in zip(dist_list, idx_list):
-                # print(f"[DEBUG] raw dist = {dist}, idx = {idx}, threshold = {self.temperature}, total_ids = {len(self.ids)}")
-                if dist >= self.temperature and idx != -1 and idx < len(self.ids):
-                    # Ensure that self._index_to_ids([idx]) returns an iterable
-                    chunk_id_result = self._index_to_ids([idx])
-                    #print(f"[DEBUG] FAISS index {idx} → chunk_id {chunk_id_result[0]}, distance = {dist}")
-
-                    if chunk_id_result is None:
-                        continue  # Skip this iteration if chunk_id_result is None
-                    #print(f"[DEBUG] chunk_id_result = {chunk_id_result}")
-
-                    chunk_id = chunk_id_result[0]  # Assuming this maps an index to an ID
-
-                    # If the chunk_id is not in the dictionary, add it with empty lists for queries and distances
-                    if chunk_id not in chunk_query_dict:
-                        chunk_query_dict[chunk_id] = {"queries": [], "distances": []}
-
-                    # Append the query and distance to the lists for this chunk_id
-                    chunk_query_dict[chunk_id]["queries"].append(query_str)
-                    chunk_query_dict[chunk_id]["distances"].append(float(round(dist, 2)))
-
-        # Print the resulting dictionary
-        for chunk_id, data in chunk_query_dict.items():
-            db.add_keyword_and_distance(str(chunk_id), str(data["queries"]), str(data["distances"]))
-        return distances, indices
\ No newline at end of file
+        return self._group_hits(queries, lims, scores, positions, ids)
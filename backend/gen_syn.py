@@ -7,8 +7,6 @@ from constants import get_openai_client
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-_client = get_openai_client()
-
 class GenModel():
     def __init__(self, model: str, role: str):
         self.model = model
@@ -23,7 +21,7 @@ class GenModel():
 
     def generate_answer(self, prompt: str) -> list:
         self.prompt = prompt
-        completion = _client.chat.completions.create(
+        completion = get_openai_client().chat.completions.create(
         model=self.model,
         messages=[
             {
@@ -43,7 +41,13 @@ class GenModel():
     def generate_synonyms(self, prompt:str) -> list: 
         self.answers = []
         self.prompt = prompt
-        completion = _client.chat.completions.create(
+        self.answers.extend(self.request_synonyms(prompt))
+        print(f"Generated answer: {self.answers}")
+        return self.get_answer()
+
+    def request_synonyms(self, prompt: str) -> list:
+        """Like generate_synonyms, but keeps no state on the model, so it can run on several threads at once."""
+        completion = get_openai_client().chat.completions.create(
         model=self.model,
         messages=[
             {
@@ -52,15 +56,12 @@ class GenModel():
             },
             {
                 "role": "user",
-                "content": self.prompt
+                "content": prompt
             },
         ]
         )
         answer = completion.choices[0].message.content
-        answer_words = [word.strip() for word in answer.split(',')]
-        self.answers.extend(answer_words)
-        print(f"Generated answer: {self.answers}")
-        return self.get_answer()
+        return [word.strip() for word in answer.split(',')]
 
 
 def generate_judge_eng(syn_number: int):
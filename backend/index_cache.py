@@ -0,0 +1,141 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from faiss_index import FaissIndex
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class ProjectIndexCache:
+    """
+    Keeps one FaissIndex per project in memory so searches don't rebuild the index from SQLite.
+
+    Indexes are built on the first search of a project, kept up to date by ChunkDatabase when chunks
+    are inserted or deleted, and evicted least-recently-used first once the total vector memory
+    exceeds `max_bytes`. Changes made by another process (e.g. another gunicorn worker) are caught
+    by checking the index against the project's state in the database, see get_index().
+    """
+
+    def __init__(self, max_bytes: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("INDEX_CACHE_MAX_MB", "1024")) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._indexes = OrderedDict()  # project_name -> FaissIndex, least recently used first
+        self._building = {}  # project_name -> Lock held while its index is built
+        self._lock = threading.RLock()  # Guards the two dicts and the counters, never held during a build
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0  # Rebuilds because the database changed outside this process
+        self.build_time = 0.0  # Total seconds spent building indexes
+        self.last_build_time = 0.0
+
+    def get_index(self, project_name: str, loader: Callable[[str], Tuple[List[str], np.ndarray]], temperature: float = 0.5,
+                  state: Tuple[int, Optional[str]] = None) -> FaissIndex:
+        """
+        Return the cached index for a project, building it on a miss from `loader(project_name)`:
+        the chunk IDs and an (n, d) matrix of their normalized vectors (ChunkDatabase.get_vectors_by_project).
+
+        With `state`, the (chunk count, newest chunk ID) of the project in the database
+        (ChunkDatabase.get_project_state), a cached index that doesn't match it is stale and rebuilt.
+        """
+        index = self._lookup(project_name, state)
+        if index is not None:
+            return index
+
+        # One build per project at a time, lookups of other projects go on meanwhile
+        with self._lock:
+            build_lock = self._building.setdefault(project_name, threading.Lock())
+        with build_lock:
+            index = self._lookup(project_name, state)  # Built by the request we waited for
+            if index is not None:
+                return index
+
+            start = time.perf_counter()
+            ids, vectors = loader(project_name)
+            index = FaissIndex.from_vectors(ids, vectors, temperature=temperature)
+            build_time = time.perf_counter() - start
+            logger.info(f"Built index for project '{project_name}' with {len(index)} vectors in {build_time:.2f}s")
+
+            # Chunks inserted or deleted during the build aren't in it, the state check of the next
+            # lookup rebuilds it then
+            with self._lock:
+                self.misses += 1
+                self.last_build_time = build_time
+                self.build_time += build_time
+                self._indexes[project_name] = index
+                self._indexes.move_to_end(project_name)
+                self._evict()
+            return index
+
+    def _lookup(self, project_name: str, state: Tuple[int, Optional[str]] = None) -> Optional[FaissIndex]:
+        """The cached index if it matches `state`, None on a miss. A stale index is dropped."""
+        with self._lock:
+            index = self._indexes.get(project_name)
+            if index is None:
+                return None
+            count, last_id = state if state is not None else (len(index), None)
+            if len(index) == count and (last_id is None or last_id in index):
+                self.hits += 1
+                self._indexes.move_to_end(project_name)
+                return index
+            self.stale += 1
+            logger.info(f"Index for project '{project_name}' is stale ({len(index)} vectors, {count} chunks), rebuilding")
+            del self._indexes[project_name]
+            return None
+
+    def add_chunks(self, project_name: str, embeddings: List[Tuple[str, np.ndarray]]):
+        """Add freshly inserted chunks to the project's index, if it is cached."""
+        with self._lock:
+            index = self._indexes.get(project_name)
+            if index is None:
+                return  # Built from the database on the next search
+            index.add(embeddings)
+            self._evict()
+
+    def remove_chunks(self, project_name: str, chunk_ids: List[str]):
+        """Remove deleted chunks from the project's index, if it is cached."""
+        with self._lock:
+            index = self._indexes.get(project_name)
+            if index is not None:
+                index.remove(chunk_ids)
+
+    def drop_project(self, project_name: str):
+        with self._lock:
+            self._indexes.pop(project_name, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def _evict(self):
+        """Evict least recently used indexes until the cache fits in max_bytes. The newest index always stays."""
+        total = sum(index.nbytes() for index in self._indexes.values())
+        while total > self.max_bytes and len(self._indexes) > 1:
+            project_name, index = self._indexes.popitem(last=False)
+            total -= index.nbytes()
+            self.evictions += 1
+            logger.info(f"Evicted index for project '{project_name}' from the cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "stale": self.stale,
+                "build_time_total": round(self.build_time, 4),
+                "build_time_last": round(self.last_build_time, 4),
+                "projects": {name: len(index) for name, index in self._indexes.items()},
+                "bytes": sum(index.nbytes() for index in self._indexes.values()),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,163 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from itertools import count
+from typing import List, Callable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+class IngestJob:
+    """One /process-files run: the files to ingest, its state and its progress counters."""
+
+    def __init__(self, project_name: str, files: List[str], file_names: List[str]):
+        self.job_id = str(uuid.uuid4())
+        self.project_name = project_name
+        self.files = files
+        self.file_names = file_names
+        self.size = sum(os.path.getsize(path) for path in files if os.path.exists(path))  # Bytes, used for scheduling
+
+        self.state = "queued"  # queued -> running -> done | failed | cancelled
+        self.files_done = 0
+        self.pages_done = 0
+        self.chunks_done = 0
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = {}  # Filled by the job function when it finishes
+        self._cancel = threading.Event()
+
+    def file_done(self, file_key: str, pages: int):
+        """Progress callback for FileHandler.iter_chunks."""
+        self.files_done += 1
+        self.pages_done += pages
+
+    def chunk_done(self):
+        """Called for every chunk handed to the database. Stops the job when it was cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.chunks_done += 1
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "project_name": self.project_name,
+            "state": self.state,
+            "files_total": len(self.files),
+            "files_done": self.files_done,
+            "pages_done": self.pages_done,
+            "chunks_done": self.chunks_done,
+            "bytes": self.size,
+            "elapsed": round(elapsed, 2),
+            "chunks_per_sec": round(self.chunks_done / elapsed, 1) if elapsed else 0.0,
+            "pages_per_sec": round(self.pages_done / elapsed, 2) if elapsed else 0.0,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class JobQueue:
+    """
+    In-process queue that runs ingestion jobs on a background thread, smallest upload first.
+
+    Jobs run one at a time: they share the FileHandler and the embedding model. Shortest-job-first
+    uses the total file size minus `aging` bytes for every second the job has waited, so a large
+    upload can't be starved by a stream of small ones (and its staged files don't outlive
+    BLOB_CACHE_MIN_AGE while it waits). Ties run in submission order. A cancelled job stops at its
+    next chunk; the batches it already inserted stay in the database.
+
+    The queue lives in the process, with several gunicorn workers a job is only known to the worker
+    that accepted it.
+
+    `aging` defaults to the JOB_AGING_BYTES_PER_SEC environment variable (1 MB/s: after an hour a job
+    goes before any new upload of up to 3.6 GB).
+    """
+
+    def __init__(self, run_job: Callable[[IngestJob], dict], max_finished: int = 100, aging: float = None):
+        self.run_job = run_job  # Does the work and returns the job result
+        self.max_finished = max_finished  # Finished jobs kept for status requests
+        self.aging = aging if aging is not None else float(os.getenv("JOB_AGING_BYTES_PER_SEC", str(1024 * 1024)))
+        self._waiting = []  # (submission order, job), picked by _priority
+        self._jobs = {}
+        self._order = count()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._worker = None
+
+    def submit(self, project_name: str, files: List[str], file_names: List[str]) -> IngestJob:
+        job = IngestJob(project_name, list(files), list(file_names))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="ingest-worker", daemon=True)
+                self._worker.start()
+            self._waiting.append((next(self._order), job))
+            self._ready.notify()
+        logger.info(f"Queued job {job.job_id}: {len(files)} files, {job.size} bytes for project '{project_name}'")
+        return job
+
+    def get(self, job_id: str) -> IngestJob:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestJob]:
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it doesn't exist or already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.state not in ("queued", "running"):
+            return False
+        job._cancel.set()
+        if job.state == "queued":
+            job.state = "cancelled"
+            job.finished_at = time.time()
+        return True
+
+    def _priority(self, job: IngestJob, now: float) -> float:
+        return job.size - self.aging * (now - job.submitted_at)
+
+    def _next(self) -> IngestJob:
+        with self._ready:
+            while not self._waiting:
+                self._ready.wait()
+            now = time.time()
+            entry = min(self._waiting, key=lambda entry: (self._priority(entry[1], now), entry[0]))
+            self._waiting.remove(entry)
+            return entry[1]
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job._cancel.is_set():
+                continue  # Cancelled while queued
+
+            job.state = "running"
+            job.started_at = time.time()
+            try:
+                job.result = self.run_job(job) or {}
+                job.state = "done"
+            except JobCancelled:
+                job.state = "cancelled"
+                logger.info(f"Job {job.job_id} cancelled after {job.chunks_done} chunks")
+            except Exception as e:
+                job.state = "failed"
+                job.error = str(e)
+                logger.error(f"Job {job.job_id} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in sorted(finished, key=lambda job: job.finished_at)[:-self.max_finished or None]:
+            del self._jobs[job.job_id]
@@ -0,0 +1,140 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _page_number(image_path: str) -> int:
+    """Page of an image rendered by pdftoppm: "<prefix>-<page>.<ext>", the page zero-padded."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return int(stem.rsplit("-", 1)[1])
+
+
+class OcrEngine:
+    """
+    OCR for the image-only pages of a PDF.
+
+    All requested pages of a file are rasterized with as few poppler calls as possible (one per run of
+    nearby pages) into a temporary folder, Tesseract runs over them on a thread pool, and the text is
+    cached in SQLite by a hash of the page image, so the same page is never OCR'd twice.
+
+    Settings default to the OCR_DPI, OCR_LANG, OCR_WORKERS and OCR_CACHE_PATH environment variables.
+    """
+
+    def __init__(self, dpi: int = None, lang: str = None, workers: int = None, cache_path: str = None):
+        self.dpi = dpi or int(os.getenv("OCR_DPI", "300"))
+        self.lang = lang or os.getenv("OCR_LANG", "nld+eng")
+        self.workers = workers or int(os.getenv("OCR_WORKERS", "2"))
+        self.cache_path = cache_path or os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite")
+        if self.workers > 1:
+            # Tesseract's own OpenMP threads would compete with the pool
+            os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        self._init_cache()
+
+    def _init_cache(self):
+        conn = sqlite3.connect(self.cache_path, timeout=30)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                image_hash TEXT PRIMARY KEY,
+                text TEXT
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def ocr_pdf_pages(self, file_path: str, page_numbers: List[int]) -> Dict[int, str]:
+        """OCR the given (1-based) pages of a PDF. Returns {page_number: text}."""
+        if not page_numbers:
+            return {}
+
+        with tempfile.TemporaryDirectory() as folder:
+            images = self._rasterize(file_path, sorted(set(page_numbers)), folder)
+            return self.ocr_images(images)
+
+    def _rasterize(self, file_path: str, page_numbers: List[int], folder: str, max_gap: int = 2) -> Dict[int, str]:
+        """
+        Render pages to image files in `folder`. Returns {page_number: image_path}.
+
+        Nearby pages are rendered in one poppler call (a few unneeded pages in between are cheaper than
+        re-opening the PDF), the extra pages are ignored.
+        """
+        from pdf2image import convert_from_path
+
+        runs = []
+        for page in page_numbers:
+            if runs and page - runs[-1][1] <= max_gap + 1:
+                runs[-1][1] = page
+            else:
+                runs.append([page, page])
+
+        wanted = set(page_numbers)
+        images = {}
+        for first, last in runs:
+            paths = convert_from_path(
+                file_path, dpi=self.dpi, first_page=first, last_page=last,
+                output_folder=folder, fmt="ppm", paths_only=True, thread_count=self.workers,
+            )
+            for path in paths:
+                page = _page_number(path)
+                if page in wanted:
+                    images[page] = path
+        return images
+
+    def _image_hash(self, image_path: str) -> str:
+        digest = hashlib.sha256(f"{self.lang}:".encode("utf-8"))
+        with open(image_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def ocr_images(self, images: Dict[int, str]) -> Dict[int, str]:
+        """OCR image files ({page_number: image_path}), using the cache. Returns {page_number: text}."""
+        if not images:
+            return {}
+        import pytesseract
+
+        hashes = {page: self._image_hash(path) for page, path in images.items()}
+        texts = self._cache_get(list(set(hashes.values())))
+
+        # Identical pages (title blocks, blank sheets) are recognized once
+        missing = {}
+        for page, image_hash in hashes.items():
+            if image_hash not in texts:
+                missing.setdefault(image_hash, images[page])
+        logger.info(f"OCR: {len(images)} pages, {len(missing)} to recognize, the rest from cache")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            recognized = pool.map(lambda path: pytesseract.image_to_string(path, lang=self.lang).strip(), missing.values())
+            new_texts = dict(zip(missing.keys(), recognized))
+
+        self._cache_put(list(new_texts.items()))
+        texts.update(new_texts)
+        return {page: texts[image_hash] for page, image_hash in hashes.items()}
+
+    def _cache_get(self, image_hashes: List[str]) -> Dict[str, str]:
+        conn = sqlite3.connect(self.cache_path, timeout=30)
+        cursor = conn.cursor()
+        rows = {}
+        for i in range(0, len(image_hashes), 500):
+            batch = image_hashes[i:i + 500]
+            cursor.execute(
+                f"SELECT image_hash, text FROM ocr_cache WHERE image_hash IN ({','.join('?' for _ in batch)})",
+                batch,
+            )
+            rows.update(cursor.fetchall())
+        conn.close()
+        return rows
+
+    def _cache_put(self, entries):
+        if not entries:
+            return
+        conn = sqlite3.connect(self.cache_path, timeout=30)
+        conn.executemany("INSERT OR REPLACE INTO ocr_cache (image_hash, text) VALUES (?, ?)", entries)
+        conn.commit()
+        conn.close()
@@ -0,0 +1,38 @@
+import os
+import re
+import time
+import random
+import logging
+from types import SimpleNamespace
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class StubOpenAIClient:
+    """
+    Offline stand-in for the OpenAI client, for load tests of the synonym path.
+
+    Implements chat.completions.create(model=..., messages=[...]). Every call sleeps for `latency`
+    seconds (plus up to `jitter`) and answers with five made-up words derived from the last word of
+    the user message, separated by commas like the real prompt asks for.
+
+    Selected by get_openai_client() when OPENAI_STUB=1. OPENAI_STUB_LATENCY and OPENAI_STUB_JITTER
+    set the delays in seconds.
+    """
+
+    def __init__(self, latency: float = None, jitter: float = None):
+        self.latency = latency if latency is not None else float(os.getenv("OPENAI_STUB_LATENCY", "0.5"))
+        self.jitter = jitter if jitter is not None else float(os.getenv("OPENAI_STUB_JITTER", "0.2"))
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        logger.warning("Using the stub OpenAI client, answers are made up")
+
+    def _create(self, model: str, messages: list, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = re.findall(r"\w+", prompt)
+        keyword = words[-1].lower() if words else "woord"
+        content = ", ".join(f"{keyword}{suffix}" for suffix in ("werk", "bouw", "deel", "laag", "stuk"))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
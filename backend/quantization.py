@@ -0,0 +1,67 @@
+import os
+import numpy as np
+
+# Storage formats of an embedding, selected with the EMBEDDING_DTYPE environment variable.
+#   float32: raw vectors (4 bytes per dimension), exact
+#   float16: half precision (2 bytes per dimension)
+#   int8:    unit-normalized vector scaled to [-127, 127] (1 byte per dimension)
+# Search uses cosine similarity, so float16 and int8 store the normalized vector: the length is lost.
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+_INT8_SCALE = 127.0
+
+# numpy dtype and scale of each format for matrices of normalized vectors (VectorStore files)
+ROW_FORMATS = {"float32": (np.float32, 1.0), "float16": (np.float16, 1.0), "int8": (np.int8, _INT8_SCALE)}
+
+
+def default_dtype() -> str:
+    dtype = os.getenv("EMBEDDING_DTYPE", "float32")
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"EMBEDDING_DTYPE must be one of {EMBEDDING_DTYPES}, got '{dtype}'")
+    return dtype
+
+
+def _normalized(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_embedding(vector: np.ndarray, dtype: str) -> bytes:
+    """Embedding -> BLOB in the given storage format."""
+    if dtype == "float32":
+        return np.asarray(vector, dtype=np.float32).tobytes()
+    if dtype == "float16":
+        return _normalized(vector).astype(np.float16).tobytes()
+    if dtype == "int8":
+        return np.round(_normalized(vector) * _INT8_SCALE).astype(np.int8).tobytes()
+    raise ValueError(f"Unknown embedding dtype '{dtype}'")
+
+
+def decode_embedding(blob: bytes, dtype: str = None) -> np.ndarray:
+    """BLOB -> float32 embedding. Rows stored before the embedding_dtype column existed have no dtype (float32)."""
+    if dtype is None or dtype == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if dtype == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if dtype == "int8":
+        return np.frombuffer(blob, dtype=np.int8).astype(np.float32) / _INT8_SCALE
+    raise ValueError(f"Unknown embedding dtype '{dtype}'")
+
+
+def encode_rows(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """Normalized float32 (n, d) rows -> rows in the given storage format."""
+    numpy_dtype, scale = ROW_FORMATS[dtype]
+    if scale != 1.0:
+        return np.round(vectors * scale).astype(numpy_dtype)
+    return vectors.astype(numpy_dtype, copy=False)
+
+
+def decode_rows(rows: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """Stored rows -> float32 rows. float32 rows (e.g. a memmap) are returned as they are, without a copy."""
+    if rows.dtype == np.float32:
+        return rows
+    vectors = rows.astype(np.float32)
+    if scale != 1.0:
+        vectors /= scale
+    return vectors
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict
+import numpy as np
+from constants import get_model, MODEL_NAME
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Cache key of a query: surrounding and repeated whitespace don't change what is searched."""
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query embeddings (keywords, synonyms), keyed by model name and text.
+
+    Only the texts that are not cached are sent to the model, in one encode call. With a `path` the
+    embeddings are also kept in SQLite, so they survive restarts; the memory cache is filled from it
+    on a miss.
+
+    Settings default to the QUERY_CACHE_SIZE and QUERY_CACHE_PATH environment variables, no path
+    means memory only.
+    """
+
+    def __init__(self, max_entries: int = None, path: str = None, model_name: str = MODEL_NAME):
+        self.max_entries = max_entries or int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+        self.path = path if path is not None else os.getenv("QUERY_CACHE_PATH")
+        self.model_name = model_name
+        self._entries = OrderedDict()  # normalized text -> embedding, least recently used first
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model_name TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    PRIMARY KEY (model_name, text)
+                )
+            ''')
+            conn.commit()
+            conn.close()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings of `texts` as a (len(texts), d) float32 array, like model.encode(texts, convert_to_numpy=True)."""
+        keys = [normalize_text(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in set(keys):
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = embedding
+            self.hits += sum(1 for key in keys if key in found)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.path:
+            from_disk = self._disk_get(missing)
+            found.update(from_disk)
+            self._store(from_disk)
+            with self._lock:
+                self.disk_hits += sum(1 for key in keys if key in from_disk)
+            missing = [key for key in missing if key not in from_disk]
+
+        if missing:
+            encoded = dict(zip(missing, np.asarray(get_model().encode(missing, convert_to_numpy=True), dtype=np.float32)))
+            found.update(encoded)
+            self._store(encoded)
+            if self.path:
+                self._disk_put(encoded)
+            with self._lock:
+                self.misses += sum(1 for key in keys if key in encoded)
+
+        return np.stack([found[key] for key in keys])
+
+    def _store(self, embeddings: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, embedding in embeddings.items():
+                embedding.setflags(write=False)  # Shared between callers
+                self._entries[key] = embedding
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        cursor = conn.cursor()
+        rows = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            cursor.execute(
+                f"SELECT text, embedding FROM query_embeddings WHERE model_name = ? AND text IN ({','.join('?' for _ in batch)})",
+                [self.model_name] + batch,
+            )
+            rows.update((text, np.frombuffer(blob, dtype=np.float32).copy()) for text, blob in cursor.fetchall())
+        conn.close()
+        return rows
+
+    def _disk_put(self, embeddings: Dict[str, np.ndarray]):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executemany(
+            "INSERT OR REPLACE INTO query_embeddings (model_name, text, embedding) VALUES (?, ?, ?)",
+            [(self.model_name, key, embedding.tobytes()) for key, embedding in embeddings.items()],
+        )
+        conn.commit()
+        conn.close()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "persistent": bool(self.path),
+            }
+
+
+_QUERY_CACHE = None
+_QUERY_CACHE_LOCK = threading.Lock()
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """The cache shared by search and the synonym evaluators."""
+    global _QUERY_CACHE
+    with _QUERY_CACHE_LOCK:
+        if _QUERY_CACHE is None:
+            _QUERY_CACHE = QueryEmbeddingCache()
+    return _QUERY_CACHE
+
+def encode_queries(texts: List[str]) -> np.ndarray:
+    """get_model().encode(texts) through the shared cache."""
+    return get_query_cache().encode(texts)
@@ -0,0 +1,94 @@
+import os
+import time
+import random
+import logging
+import sqlite3
+import threading
+from functools import wraps
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """
+    A thread's pooled sqlite3 connection. Behaves like the connection itself, except that close()
+    hands it back to the pool (rolling back whatever was not committed) instead of closing it.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+class SQLitePool:
+    """
+    One connection per thread and database file, opened on first use and reused afterwards.
+
+    Every connection runs in WAL mode (readers don't wait for the ingest writer and the other way
+    around) with synchronous=NORMAL, a larger page cache and memory-mapped reads, and waits up to
+    `timeout` seconds for a lock instead of failing at once.
+
+    Settings default to the SQLITE_TIMEOUT, SQLITE_CACHE_MB and SQLITE_MMAP_MB environment variables.
+    """
+
+    def __init__(self, db_path: str, timeout: float = None, cache_mb: int = None, mmap_mb: int = None):
+        self.db_path = db_path
+        self.timeout = timeout or float(os.getenv("SQLITE_TIMEOUT", "30"))
+        self.cache_mb = cache_mb or int(os.getenv("SQLITE_CACHE_MB", "64"))
+        self.mmap_mb = mmap_mb or int(os.getenv("SQLITE_MMAP_MB", "256"))
+        self._local = threading.local()
+
+    def connection(self) -> PooledConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, only the last commits can be lost on power loss
+            conn.execute(f"PRAGMA cache_size={-self.cache_mb * 1024}")  # Negative: size in KiB
+            conn.execute(f"PRAGMA mmap_size={self.mmap_mb * 1024 * 1024}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        elif conn.in_transaction:
+            conn.rollback()  # Left open by a method that raised before closing
+        return PooledConnection(conn)
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def retry_on_busy(attempts: int = 5, delay: float = 0.05):
+    """
+    Run a database method again when SQLite reports a lock that the busy timeout couldn't resolve
+    (e.g. two transactions that both want to upgrade to a write lock). Backs off exponentially.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return method(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) and "busy" not in str(e) or attempt == attempts - 1:
+                        raise
+                    wait = delay * 2 ** attempt * (1 + random.random())
+                    logger.warning(f"{method.__name__}: database is busy, retrying in {wait:.2f}s")
+                    time.sleep(wait)
+        return wrapper
+    return decorator
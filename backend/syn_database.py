@@ -1,41 +1,104 @@
-import json 
+import json
 import os
+import sqlite3
+import time
+from typing import Dict, List
 
 
 class DataHandler:
-    def __init__(self, filepath):
+    """
+    Saved synonyms per keyword, in SQLite.
+
+    The database sits next to the old JSON file (data/syn_db.json -> data/syn_db.sqlite) unless
+    SYN_DB_PATH is set. It runs in WAL mode, so several gunicorn workers can read while one writes,
+    and every addition is one small transaction instead of rewriting the whole file. The JSON file
+    is imported once, the first time the database is opened.
+    """
+
+    def __init__(self, filepath, db_path=None):
         print("...")
         self.filepath = filepath
-        # Load database if exists, else initialize empty
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
-                print("Data base loaded correctly")
-        else:
-            self.data = {}
-            print("Database successfully created")
+        self.db_path = db_path or os.getenv("SYN_DB_PATH") or os.path.splitext(filepath)[0] + ".sqlite"
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS keywords (
+                keyword TEXT PRIMARY KEY,
+                added_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS synonyms (
+                keyword TEXT NOT NULL,
+                synonym TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (keyword, synonym)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''')
+        conn.close()
+        self._import_json()
+        print("Data base loaded correctly")
 
-    def save(self):
-        with open(self.filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=4)
+    def _connect(self):
+        # Other workers may hold the write lock for a moment, wait for it instead of failing
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _import_json(self):
+        """Copy the synonyms of the old JSON file into the database, once."""
+        if not os.path.exists(self.filepath) or not self.filepath.endswith(".json"):
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")  # Only one worker imports
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                conn.rollback()
+                return
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._insert(conn, data)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (self.filepath,))
+            conn.commit()
+            print(f"Imported {len(data)} keywords from {self.filepath}")
+        finally:
+            conn.close()
+
+    def _insert(self, conn, data: Dict[str, List[str]]):
+        now = time.time()
+        conn.executemany("INSERT OR IGNORE INTO keywords (keyword, added_at) VALUES (?, ?)", [(word, now) for word in data])
+        # New synonyms go after the ones already saved for the keyword, in the given order
+        conn.executemany('''
+            INSERT OR IGNORE INTO synonyms (keyword, synonym, position)
+            VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM synonyms WHERE keyword = ?))
+        ''', [(word, syn, word) for word, synonyms in data.items() for syn in synonyms])
 
     def get_synonyms(self, word):
-        return self.data.get(word, [])
+        conn = self._connect()
+        rows = conn.execute("SELECT synonym FROM synonyms WHERE keyword = ? ORDER BY position", (word,)).fetchall()
+        conn.close()
+        return [row[0] for row in rows]
 
     def add_synonyms(self, word, synonyms):
-        if word not in self.data:
-            self.data[word] = []
-        # Only add if not already present
-        for syn in synonyms:
-            if syn not in self.data[word]:
-                self.data[word].append(syn)
-        self.save()
-        print(f"Synonyms for '{word}' updated: {self.data[word]}")
+        self.add_many({word: synonyms})
+        print(f"Synonyms for '{word}' updated: {self.get_synonyms(word)}")
+
+    def add_many(self, data: Dict[str, List[str]]):
+        """Save the synonyms of several keywords in one transaction. Synonyms already saved are skipped."""
+        conn = self._connect()
+        with conn:
+            self._insert(conn, data)
+        conn.close()
 
     def is_saved(self, word):
-        if word in self.data:
-            print("This keyword is saved in the database from " + self.filepath)
+        conn = self._connect()
+        found = conn.execute("SELECT 1 FROM keywords WHERE keyword = ?", (word,)).fetchone() is not None
+        conn.close()
+        if found:
+            print("This keyword is saved in the database from " + self.db_path)
             return 1
         else:
-            print("This keyword is not saved in the database from " + self.filepath)
-            return 0
\ No newline at end of file
+            print("This keyword is not saved in the database from " + self.db_path)
+            return 0
@@ -1,15 +1,20 @@
-from constants import get_model
-from sentence_transformers import util
+import numpy as np
+from query_cache import encode_queries
 
 
+def _cos_sim(emb1: np.ndarray, emb2: np.ndarray) -> np.ndarray:
+    emb1 = emb1 / np.linalg.norm(emb1, axis=-1, keepdims=True)
+    emb2 = emb2 / np.linalg.norm(emb2, axis=-1, keepdims=True)
+    return emb2 @ emb1
+
 def semantic_similarity(word1, word2):
-    model = get_model()
-    emb1 = model.encode(word1)
-    emb2 = model.encode(word2)
-    return util.cos_sim(emb1, emb2).item()
+    emb1, emb2 = encode_queries([word1, word2])
+    return float(_cos_sim(emb1, emb2))
 
 def calculate_embedding_similarity(keyword: str, answers: list) -> list:
-    similarities = [semantic_similarity(keyword, answer) for answer in answers]
+    # The keyword and all answers in one (cached) encode call
+    embeddings = encode_queries([keyword] + list(answers))
+    similarities = _cos_sim(embeddings[0], embeddings[1:]).tolist()
 
     # Calculate min, max, and average similarity
     min_sim = min(similarities)
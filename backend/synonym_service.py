@@ -0,0 +1,115 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Callable, Dict, List
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SynonymService:
+    """
+    Synonyms of many keywords at once: saved ones from the store, new ones from concurrent LLM calls.
+
+    - Keywords that are not saved yet are generated on a thread pool, so five new keywords cost
+      about one LLM round-trip instead of five.
+    - A keyword that is already being generated (by this or another request) is not requested
+      again, the request waits for the call in flight.
+    - A request waits at most `budget` seconds. Keywords that are not done by then are reported as
+      pending; their calls keep running and the synonyms are saved for the next request.
+
+    Settings default to the SYNONYM_WORKERS and SYNONYM_BUDGET environment variables.
+    """
+
+    def __init__(self, generate: Callable[[str], List[str]], store, workers: int = None, budget: float = None):
+        self.generate = generate  # keyword -> synonyms, one LLM call
+        self.store = store  # DataHandler with the saved synonyms
+        self.budget = budget or float(os.getenv("SYNONYM_BUDGET", "10"))
+        self._pool = ThreadPoolExecutor(max_workers=workers or int(os.getenv("SYNONYM_WORKERS", "8")), thread_name_prefix="synonyms")
+        self._in_flight = {}  # keyword -> Future of its LLM call
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.saved_hits = 0
+        self.llm_calls = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    def get_synonyms(self, keywords: List[str], budget: float = None) -> Dict[str, object]:
+        """
+        Returns {"synonyms": {keyword: [...]}, "pending": [...], "failed": {keyword: error}}.
+
+        `synonyms` holds the saved keywords and the ones generated within the budget.
+        """
+        budget = self.budget if budget is None else float(budget)
+        synonyms, futures = {}, {}
+        for keyword in dict.fromkeys(keywords):
+            if self.store.is_saved(keyword):
+                synonyms[keyword] = self.store.get_synonyms(keyword)
+                with self._lock:
+                    self.saved_hits += 1
+            else:
+                futures[keyword] = self._submit(keyword)
+
+        if futures:
+            wait(futures.values(), timeout=budget)
+
+        pending, failed = [], {}
+        for keyword, future in futures.items():
+            if not future.done():
+                pending.append(keyword)
+            elif future.exception() is not None:
+                failed[keyword] = str(future.exception())
+            else:
+                synonyms[keyword] = future.result()
+
+        if pending:
+            with self._lock:
+                self.timeouts += len(pending)
+            logger.warning(f"Synonym budget of {budget}s exceeded, still pending: {pending}")
+        return {"synonyms": synonyms, "pending": pending, "failed": failed}
+
+    def _submit(self, keyword: str) -> Future:
+        with self._lock:
+            future = self._in_flight.get(keyword)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            if self.store.is_saved(keyword):  # Saved by a call that finished since the caller looked
+                future = Future()
+                future.set_result(self.store.get_synonyms(keyword))
+                return future
+            future = self._pool.submit(self.generate, keyword)
+            self._in_flight[keyword] = future
+            self.llm_calls += 1
+        future.add_done_callback(lambda future: self._finished(keyword, future))
+        return future
+
+    def _finished(self, keyword: str, future: Future):
+        """Save the synonyms when the call finishes, also when the request that started it stopped waiting."""
+        with self._lock:
+            try:
+                if future.exception() is None:
+                    self.store.add_synonyms(keyword, future.result())
+                else:
+                    self.failures += 1
+                    logger.error(f"Generating synonyms for '{keyword}' failed: {future.exception()}")
+            finally:
+                self._in_flight.pop(keyword, None)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool, by default after the calls in flight have finished and been saved."""
+        self._pool.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "saved_hits": self.saved_hits,
+                "llm_calls": self.llm_calls,
+                "coalesced": self.coalesced,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._in_flight),
+            }
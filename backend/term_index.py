@@ -0,0 +1,132 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List
+import faiss
+import numpy as np
+from constants import get_model
+from query_cache import encode_queries
+from vector_store import normalize_rows
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Words that never make a useful term on their own or at the edge of a bigram
+STOPWORDS = set("""
+de het een en van in op te dat die is voor met zijn niet aan er om ook als bij of door naar dan
+maar worden wordt werd tot uit over nog wel kan moet deze dit zo al meer geen hun hij zij wij ze
+zal zou dus waar hoe wat wie onder tussen tegen na per via the and for with that this from are was
+be by on at to of an or as it is not which
+""".split())
+
+_WORD = re.compile(r"[^\W\d_][\w-]*[^\W\d_]", re.UNICODE)  # At least two letters, no numbers-only tokens
+
+
+def extract_terms(texts: Iterable[str], max_n: int = 2, min_count: int = 2, max_terms: int = None) -> List[str]:
+    """
+    The most frequent words and n-grams (up to `max_n` words) of a corpus, lowercased.
+
+    N-grams don't start or end with a stopword, terms seen fewer than `min_count` times are dropped.
+    """
+    max_terms = max_terms or int(os.getenv("TERM_INDEX_MAX_TERMS", "20000"))
+    counts = Counter()
+    for text in texts:
+        words = _WORD.findall(text.lower())
+        for n in range(1, max_n + 1):
+            for i in range(len(words) - n + 1):
+                gram = words[i:i + n]
+                if any(word in STOPWORDS or len(word) < 3 for word in (gram[0], gram[-1])):
+                    continue
+                counts[" ".join(gram)] += 1
+    return [term for term, count in counts.most_common(max_terms) if count >= min_count]
+
+
+class TermIndex:
+    """Embeddings of a project's vocabulary, searched for the terms closest to a keyword."""
+
+    def __init__(self, terms: List[str], embeddings: np.ndarray):
+        self.terms = terms
+        self.index = faiss.IndexFlatIP(embeddings.shape[1])
+        if len(terms):
+            self.index.add(normalize_rows(embeddings))
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def neighbours(self, keywords: List[str], k: int = 5, min_score: float = 0.6) -> Dict[str, List[str]]:
+        """Up to `k` terms per keyword with a cosine similarity of at least `min_score`, best first."""
+        if not keywords or self.index.ntotal == 0:
+            return {keyword: [] for keyword in keywords}
+        # One extra, the keyword itself is usually in the vocabulary
+        scores, positions = self.index.search(normalize_rows(encode_queries(keywords)), min(k + 1, self.index.ntotal))
+        result = {}
+        for keyword, row_scores, row_positions in zip(keywords, scores, positions):
+            own = keyword.strip().lower()
+            terms = [self.terms[pos] for score, pos in zip(row_scores, row_positions) if pos >= 0 and score >= min_score and self.terms[pos] != own]
+            result[keyword] = terms[:k]
+        return result
+
+
+class TermIndexes:
+    """
+    One TermIndex per project, built from its chunks on first use and rebuilt when the project changes:
+    its (chunk count, newest chunk ID) in the database differs from when the index was built, so a
+    file replaced by one with as many chunks is caught too. Deleted projects are dropped by the app.
+
+    Building embeds every term once (seconds to a minute for a large project). After that a lookup
+    costs one keyword encode and a search, in milliseconds, without an LLM call.
+    """
+
+    def __init__(self, db, batch_size: int = 256):
+        self.db = db
+        self.batch_size = batch_size
+        self._indexes = {}  # project_name -> (ChunkDatabase.get_project_state when built, TermIndex)
+        self._building = {}  # project_name -> Lock held while its index is built
+        self._lock = threading.Lock()  # Guards the two dicts only, never held during a build
+
+    def _cached(self, project_name: str, state):
+        with self._lock:
+            cached = self._indexes.get(project_name)
+            return cached[1] if cached is not None and cached[0] == state else None
+
+    def get(self, project_name: str) -> TermIndex:
+        state = self.db.get_project_state(project_name)
+        index = self._cached(project_name, state)
+        if index is not None:
+            return index
+
+        # One build per project at a time, lookups of other projects go on meanwhile
+        with self._lock:
+            build_lock = self._building.setdefault(project_name, threading.Lock())
+        with build_lock:
+            index = self._cached(project_name, state)  # Built by the request we waited for
+            if index is not None:
+                return index
+
+            start = time.perf_counter()
+            terms = extract_terms(self.db.iter_chunk_texts(project_name))
+            model = get_model()
+            if terms:
+                embeddings = model.encode(terms, batch_size=self.batch_size, convert_to_numpy=True)
+            else:
+                embeddings = np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+            index = TermIndex(terms, np.asarray(embeddings, dtype=np.float32))
+            with self._lock:
+                self._indexes[project_name] = (state, index)
+            logger.info(f"Built term index for project '{project_name}': {len(terms)} terms in {time.perf_counter() - start:.2f}s")
+            return index
+
+    def expand(self, project_name: str, keywords: List[str], k: int = 5, min_score: float = 0.6) -> Dict[str, List[str]]:
+        """Synonym candidates of each keyword from the project's own vocabulary."""
+        return self.get(project_name).neighbours(keywords, k=k, min_score=min_score)
+
+    def drop_project(self, project_name: str):
+        with self._lock:
+            self._indexes.pop(project_name, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
@@ -0,0 +1,13 @@
+import os
+import sys
+
+# The backend modules are imported flat, like when the app runs from the backend folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def db(tmp_path):
+    from db import ChunkDatabase
+    return ChunkDatabase(str(tmp_path / "chunks.sqlite"))
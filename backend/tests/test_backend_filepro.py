@@ -0,0 +1,21 @@
+import pytest
+from backend_filepro import _page_needs_ocr
+
+pymupdf = pytest.importorskip("pymupdf")  # Optional, the pypdf2 engine is used without it
+
+
+def test_only_pages_that_show_something_need_ocr(tmp_path):
+    doc = pymupdf.open()
+    doc.new_page()  # Empty
+    white = doc.new_page()
+    white.draw_rect(white.rect, color=None, fill=(1, 1, 1))  # Content stream that only paints the background
+    drawn = doc.new_page()
+    drawn.draw_line((50, 50), (300, 300))  # Vector drawing, e.g. a CAD export
+    scanned = doc.new_page()
+    pixmap = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 20, 20), False)
+    pixmap.clear_with(80)
+    scanned.insert_image(pymupdf.Rect(50, 50, 200, 200), pixmap=pixmap)
+    doc.save(tmp_path / "pages.pdf")
+
+    with pymupdf.open(tmp_path / "pages.pdf") as doc:
+        assert [_page_needs_ocr(page) for page in doc] == [False, False, True, True]
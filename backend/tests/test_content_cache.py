@@ -0,0 +1,66 @@
+import numpy as np
+from content_cache import ContentCache
+
+
+def _chunks(file_name, file_hash, texts):
+    return [
+        {
+            "file_name": file_name,
+            "file_hash": file_hash,
+            "file_chunk_count": len(texts),
+            "content": text,
+            "embedding": np.full(4, i + 1, dtype=np.float32),
+            "metadata": {"page": 1, "chunk_index": i},
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_revised_file_replaces_the_old_version(db):
+    db.insert_chunks("P", _chunks("plan.pdf", "v1", ["fundering", "betonvloer"]))
+    db.insert_chunks("P", _chunks("other.pdf", "o1", ["dak"]))
+    cache = ContentCache(db, "P")
+
+    assert not cache.is_unchanged("v2", "plan.pdf")
+    cache.replace_old_version("v2", "plan.pdf")
+    db.insert_chunks("P", _chunks("plan.pdf", "v2", ["fundering", "staalconstructie"]))
+
+    assert db.get_chunks_by_file_hash("v1") == []
+    assert [chunk["content"] for chunk in db.get_chunks_by_file_hash("v2")] == ["fundering", "staalconstructie"]
+    assert db.count_chunks("P") == 3
+    assert {f["file_name"]: f["chunk_count"] for f in db.get_files_scanned_status_and_time("P")} == {"plan.pdf": 2, "other.pdf": 1}
+    assert cache.stats()["files_replaced"] == 1
+
+
+def test_same_version_is_not_replaced(db):
+    db.insert_chunks("P", _chunks("plan.pdf", "v1", ["fundering"]))
+    ContentCache(db, "P").replace_old_version("v1", "plan.pdf")
+    assert db.count_chunks("P") == 1
+
+
+def test_interrupted_ingest_is_not_skipped_or_copied(db):
+    chunks = _chunks("plan.pdf", "v1", ["fundering", "betonvloer", "dak"])
+    db.insert_chunks("P", chunks[:2])  # The job stopped before the last batch
+    cache = ContentCache(db, "P")
+    assert not cache.is_unchanged("v1", "plan.pdf")
+    assert not cache.has_file("v1")
+
+    db.insert_chunks("P", chunks)  # The retry stores the missing chunk, the others are updated in place
+    assert db.count_chunks("P") == 3
+    assert cache.is_unchanged("v1", "plan.pdf")
+    assert cache.has_file("v1")
+    assert len(list(ContentCache(db, "Q").copy_file("plan.pdf", "v1"))) == 3
+
+
+def test_chunks_may_complete_a_version_in_any_order(db):
+    chunks = _chunks("plan.pdf", "v1", ["fundering", "betonvloer", "dak"])
+    db.insert_chunks("P", chunks[2:])
+    db.insert_chunks("P", chunks[:2])
+    assert ContentCache(db, "P").is_unchanged("v1", "plan.pdf")
+
+
+def test_deleted_file_is_no_longer_complete(db):
+    db.insert_chunks("P", _chunks("plan.pdf", "v1", ["fundering"]))
+    db.delete_file("P", "plan.pdf")
+    assert not ContentCache(db, "P").is_unchanged("v1", "plan.pdf")
+    assert not db.has_file_hash("v1")
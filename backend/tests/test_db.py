@@ -0,0 +1,20 @@
+import numpy as np
+
+
+def _chunks(file_name, file_hash, count):
+    return [
+        {
+            "file_name": file_name,
+            "file_hash": file_hash,
+            "content": f"{file_hash} chunk {i}",
+            "embedding": np.ones(4, dtype=np.float32),
+            "metadata": {"page": 1, "chunk_index": i},
+        }
+        for i in range(count)
+    ]
+
+
+def test_file_hash_of_revised_upload_is_the_latest(db):
+    db.insert_chunks("P", _chunks("plan.pdf", "ffff", 2))
+    db.insert_chunks("P", _chunks("plan.pdf", "0000", 2))  # Revised content, sorts lower
+    assert db.get_file_hashes("P", ["plan.pdf"]) == {"plan.pdf": "0000"}
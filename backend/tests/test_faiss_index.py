@@ -0,0 +1,26 @@
+import numpy as np
+from faiss_index import FaissIndex
+
+
+def _index():
+    vectors = np.eye(4, dtype=np.float32)
+    return FaissIndex.from_vectors(["a", "b", "c", "d"], vectors, temperature=0.5, dtype="float32")
+
+
+def test_range_search_groups_hits_per_chunk():
+    query = np.array([[1, 0, 0, 0], [0.8, 0.6, 0, 0]], dtype=np.float32)
+    hits = _index().range_search(query, ["beton", "vloer"])
+    assert hits == {
+        "a": {"queries": ["beton", "vloer"], "distances": [1.0, 0.8]},
+        "b": {"queries": ["vloer"], "distances": [0.6]},
+    }
+
+
+def test_range_search_without_hits_returns_empty():
+    query = np.array([[-1, 0, 0, 0]], dtype=np.float32)
+    assert _index().range_search(query, ["dak"]) == {}
+
+
+def test_range_search_outside_selected_chunks_returns_empty():
+    query = np.array([[1, 0, 0, 0]], dtype=np.float32)
+    assert _index().range_search(query, ["beton"], chunk_ids=["c"]) == {}
@@ -0,0 +1,52 @@
+import time
+import threading
+import numpy as np
+from index_cache import ProjectIndexCache
+
+
+def test_stale_index_is_rebuilt():
+    rows = {"ids": ["a", "b"]}
+    loads = []
+
+    def loader(project_name):
+        loads.append(project_name)
+        return list(rows["ids"]), np.eye(4, dtype=np.float32)[:len(rows["ids"])]
+
+    cache = ProjectIndexCache()
+    first = cache.get_index("P", loader, state=(2, "b"))
+    assert cache.get_index("P", loader, state=(2, "b")) is first
+    assert len(loads) == 1
+
+    rows["ids"] = ["a", "b", "c"]  # Inserted by another process
+    rebuilt = cache.get_index("P", loader, state=(3, "c"))
+    assert rebuilt is not first and "c" in rebuilt
+    assert len(loads) == 2 and cache.stats()["stale"] == 1
+
+
+def test_index_kept_in_sync_in_process_is_not_rebuilt():
+    cache = ProjectIndexCache()
+    loader = lambda project_name: (["a"], np.eye(4, dtype=np.float32)[:1])
+    index = cache.get_index("P", loader, state=(1, "a"))
+    cache.add_chunks("P", [("b", np.eye(4, dtype=np.float32)[1])])
+    assert cache.get_index("P", loader, state=(2, "b")) is index
+
+
+def test_build_of_one_project_does_not_block_another():
+    release = threading.Event()
+
+    def loader(project_name):
+        if project_name == "slow":
+            release.wait(5)
+        return ["a"], np.eye(4, dtype=np.float32)[:1]
+
+    cache = ProjectIndexCache()
+    cache.get_index("fast", loader, state=(1, "a"))
+    slow = threading.Thread(target=cache.get_index, args=("slow", loader), kwargs={"state": (1, "a")})
+    slow.start()
+    time.sleep(0.1)  # The slow build is running
+    start = time.perf_counter()
+    assert len(cache.get_index("fast", loader, state=(1, "a"))) == 1
+    assert time.perf_counter() - start < 1
+    release.set()
+    slow.join()
+    assert set(cache.stats()["projects"]) == {"fast", "slow"}
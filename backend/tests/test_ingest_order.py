@@ -0,0 +1,44 @@
+import numpy as np
+import constants
+from backend_filepro import FileHandler
+from content_cache import ContentCache
+
+
+class _FakeModel:
+    def encode(self, texts, **kwargs):
+        return np.array([[len(text), 1, 0, 0] for text in texts], dtype=np.float32)
+
+
+def _sections(file_path):
+    # Lengths vary per section, so the length sort for encoding differs from document order
+    name = file_path.rsplit("/", 1)[-1]
+    return [
+        {"content": f"{name} Sectie{i} " + "tekst " * ((i * 7) % 11), "metadata": {"page": i // 4 + 1, "chunk_index": i}}
+        for i in range(40)
+    ]
+
+
+def test_chunks_are_stored_in_document_order(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "_TRANS_MODEL", _FakeModel())
+    files = []
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_text(name)
+        files.append(str(tmp_path / name))
+    handler = FileHandler()
+    monkeypatch.setattr(handler, "extract_text_chunks", _sections)
+
+    chunks = handler.iter_chunks(max_workers=1, batch_size=8, content_cache=ContentCache(db, "P"), files=files, file_names=["a.pdf", "b.pdf"])
+    db.insert_chunks_stream("P", chunks, batch_size=16)
+    db.mark_project_chunks_scanned("P")
+    db.add_exact_keyword_matches_to_chunks("Sectie", "P")
+
+    for name in ("a.pdf", "b.pdf"):
+        texts = [chunk["text"] for chunk in db.get_chunks_by_project_and_file("P", name)]
+        assert [text.split()[1] for text in texts] == [f"Sectie{i}" for i in range(40)]
+    assert [result["Document Name"] for result in db.get_filename("P")] == ["a.pdf", "b.pdf"]
+
+    # The rowids follow document order too, file after file
+    conn = db._connect()
+    stored = conn.execute("SELECT file_name, chunk_index FROM file_chunks ORDER BY rowid").fetchall()
+    conn.close()
+    assert stored == [(name, i) for name in ("a.pdf", "b.pdf") for i in range(40)]
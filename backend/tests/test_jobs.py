@@ -0,0 +1,41 @@
+import time
+import threading
+from jobs import JobQueue
+
+
+def _file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def _run_in_order(tmp_path, aging, submit_delays):
+    """Submit a large job, then small ones while the worker is blocked; return the run order."""
+    started, release, order = threading.Event(), threading.Event(), []
+
+    def run_job(job):
+        order.append(job.project_name)
+        if job.project_name == "blocker":
+            started.set()
+            release.wait(5)
+        return {}
+
+    queue = JobQueue(run_job, aging=aging)
+    queue.submit("blocker", [_file(tmp_path, "blocker", 1)], ["blocker"])
+    started.wait(5)
+    large = queue.submit("large", [_file(tmp_path, "large", 10000)], ["large"])
+    large.submitted_at -= submit_delays  # It has been waiting this long
+    small = [queue.submit(f"small{i}", [_file(tmp_path, f"small{i}", 10)], ["small"]) for i in range(3)]
+    release.set()
+    for job in [large] + small:
+        while job.finished_at is None:
+            time.sleep(0.01)
+    return order[1:]
+
+
+def test_smallest_job_first(tmp_path):
+    assert _run_in_order(tmp_path, aging=0, submit_delays=3600) == ["small0", "small1", "small2", "large"]
+
+
+def test_waiting_job_overtakes_newer_smaller_ones(tmp_path):
+    assert _run_in_order(tmp_path, aging=1024, submit_delays=3600)[0] == "large"
@@ -0,0 +1,8 @@
+from ocr import _page_number
+
+
+def test_page_number_from_pdftoppm_name():
+    # Every pdf2image thread has its own uuid prefix, names don't sort in page order
+    paths = ["/tmp/f3a1-11.ppm", "/tmp/0b2c-09.ppm", "/tmp/f3a1-10.ppm", "/tmp/0b2c-08.ppm"]
+    assert [_page_number(path) for path in paths] == [11, 9, 10, 8]
+    assert _page_number("/tmp/0b2c0d1e-2f3a-4b5c-8d9e-0f1a2b3c4d5e-0123.ppm") == 123
@@ -0,0 +1,60 @@
+import threading
+import time
+import numpy as np
+import constants
+from term_index import TermIndexes
+
+
+class _SlowModel:
+    """Fake encoder: the first build waits until released, later builds are instant."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def encode(self, texts, **kwargs):
+        if "traag" in " ".join(texts):
+            self.release.wait(5)
+        return np.random.default_rng(len(texts)).standard_normal((len(texts), 8)).astype(np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+
+class _FakeDb:
+    texts = {"slow": ["traag betonwerk"] * 3, "fast": ["snel metselwerk"] * 3}
+
+    def get_project_state(self, project_name):
+        texts = self.texts[project_name]
+        return len(texts), texts[-1]
+
+    def iter_chunk_texts(self, project_name):
+        return iter(self.texts[project_name])
+
+
+def test_build_of_one_project_does_not_block_another(monkeypatch):
+    model = _SlowModel()
+    monkeypatch.setattr(constants, "_TRANS_MODEL", model)
+    indexes = TermIndexes(_FakeDb())
+
+    slow = threading.Thread(target=indexes.get, args=("slow",))
+    slow.start()
+    time.sleep(0.1)  # The slow build is running
+    start = time.perf_counter()
+    assert len(indexes.get("fast")) > 0
+    assert time.perf_counter() - start < 1
+    model.release.set()
+    slow.join()
+
+
+def test_replaced_file_with_as_many_chunks_rebuilds_the_index(monkeypatch):
+    model = _SlowModel()
+    model.release.set()
+    monkeypatch.setattr(constants, "_TRANS_MODEL", model)
+    db = _FakeDb()
+    db.texts = {"P": ["fundering beton", "dakgoot zink", "dakgoot zink"]}
+    indexes = TermIndexes(db)
+    first = indexes.get("P")
+    assert indexes.get("P") is first
+
+    db.texts = {"P": ["fundering beton", "kozijn hout", "kozijn eiken"]}  # Same number of chunks, new content
+    assert "kozijn" in indexes.get("P").terms
@@ -0,0 +1,64 @@
+import os
+import multiprocessing
+import numpy as np
+from vector_store import VectorStore
+
+
+def _append_many(root, worker, batches):
+    store = VectorStore(root)
+    rng = np.random.default_rng(worker)
+    for batch in range(batches):
+        store.append("project", [(f"w{worker}-b{batch}-{i}", rng.standard_normal(16)) for i in range(5)])
+
+
+def test_appends_from_several_processes_all_land(tmp_path):
+    root = str(tmp_path / "store")
+    VectorStore(root)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_append_many, args=(root, worker, 40)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    ids, vectors = VectorStore(root).load("project")
+    assert len(ids) == len(set(ids)) == 4 * 40 * 5
+    assert vectors.shape == (len(ids), 16)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1, atol=1e-5)
+
+
+def test_clear_keeps_the_lock_file(tmp_path):
+    store = VectorStore(str(tmp_path))
+    store.append("project", [("a", np.ones(4))])
+    store.clear()
+    assert store.load("project") is None
+    store.append("project", [("b", np.ones(4))])
+    assert store.load("project")[0] == ["b"]
+
+
+def test_vectors_are_stored_in_the_configured_dtype(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = [(f"c{i}", rng.standard_normal(64)) for i in range(100)]
+    expected = np.array([embedding / np.linalg.norm(embedding) for _, embedding in embeddings], dtype=np.float32)
+
+    for dtype, file_name, itemsize, tolerance in (("float32", "vectors.f32", 4, 1e-6), ("float16", "vectors.f16", 2, 1e-3), ("int8", "vectors.i8", 1, 1e-2)):
+        store = VectorStore(str(tmp_path / dtype), dtype=dtype)
+        store.append("project", embeddings[:60])
+        store.append("project", embeddings[60:])
+        store.remove("project", ["c0", "c99"])
+
+        ids, vectors = store.load("project")
+        folder = store._folder("project")
+        assert os.path.getsize(os.path.join(folder, file_name)) == 98 * 64 * itemsize
+        assert ids == [f"c{i}" for i in range(1, 99)]
+        assert vectors.dtype == np.float32
+        assert np.abs(vectors - expected[1:99]).max() < tolerance
+
+
+def test_project_keeps_its_dtype_until_written_again(tmp_path):
+    VectorStore(str(tmp_path), dtype="float32").append("project", [("a", np.ones(8))])
+    store = VectorStore(str(tmp_path), dtype="int8")
+    store.append("project", [("b", np.ones(8))])
+    assert os.path.getsize(os.path.join(store._folder("project"), "vectors.f32")) == 2 * 8 * 4
+    store.write("project", [("a", np.ones(8)), ("b", np.ones(8))])
+    assert os.path.getsize(os.path.join(store._folder("project"), "vectors.i8")) == 2 * 8
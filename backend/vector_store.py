@@ -0,0 +1,203 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, Tuple, Optional
+import numpy as np
+from quantization import ROW_FORMATS, default_dtype, encode_rows, decode_rows
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Vector file of each storage dtype. Stores written before the dtype was recorded are float32
+_VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length rows, as float32. Inner product of normalized vectors = cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class VectorStore:
+    """
+    Per-project files of normalized embeddings, read with np.memmap.
+
+    Every project gets a folder with:
+      vectors.f32  the normalized vectors, one contiguous (n, dimension) row-major block
+                   (vectors.f16 / vectors.i8 when stored as float16 / int8)
+      ids.txt      the chunk IDs, line i belongs to row i
+      meta.json    the dimension, dtype and int8 scale, and how many rows / ID bytes are committed
+
+    Vectors are stored in `dtype` (EMBEDDING_DTYPE by default, see quantization.py), so float16 and
+    int8 halve or quarter the files and the page cache they take. A project keeps the dtype it was
+    written with until it is written again; load() always returns float32 rows.
+
+    Loading a project maps the vector file instead of fetching and decoding every BLOB from SQLite,
+    so it costs about the same for any project size. Inserts append to both files and then replace
+    meta.json, so an interrupted append is cut off on the next one. Deletes write a new folder and
+    swap it in.
+
+    Every read and write holds the store's lock: a thread lock between the threads of this process
+    and an flock on `.lock` in the root between processes (e.g. a second gunicorn worker or a
+    rebuild script), so appends, meta.json updates and folder swaps never interleave.
+
+    The folder defaults to the VECTOR_STORE_PATH environment variable.
+    """
+
+    def __init__(self, root: str = None, dtype: str = None):
+        self.root = root or os.getenv("VECTOR_STORE_PATH", "vector_store")
+        self.dtype = dtype or default_dtype()
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(self.root, ".lock")
+
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        """Hold the store's lock, shared for reads, exclusive for writes (the flock part)."""
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _folder(self, project_name: str) -> str:
+        # Project names are free text, hash them into a safe folder name
+        return os.path.join(self.root, hashlib.sha1(project_name.encode("utf-8")).hexdigest())
+
+    def _read_meta(self, folder: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(folder, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, folder: str, meta: dict):
+        tmp_path = os.path.join(folder, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(folder, "meta.json"))
+
+    def load(self, project_name: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        """
+        (chunk_ids, (n, dimension) float32 vectors) of a project, None if it has no store yet. A float32
+        store is returned as a read-only memmap, float16 and int8 stores are decoded from theirs.
+        """
+        with self._locked(shared=True):
+            loaded = self._load(project_name)
+            if loaded is None:
+                return None
+            meta, ids, rows = loaded
+            return ids, decode_rows(rows, meta["scale"])
+
+    def _load(self, project_name: str) -> Optional[Tuple[dict, List[str], np.ndarray]]:
+        """(meta, chunk_ids, read-only memmap of the rows in the stored dtype)."""
+        folder = self._folder(project_name)
+        meta = self._read_meta(folder)
+        if meta is None:
+            return None
+        meta.setdefault("dtype", "float32")
+        meta.setdefault("scale", 1.0)
+        rows, dimension = meta["rows"], meta["dimension"]
+        numpy_dtype = ROW_FORMATS[meta["dtype"]][0]
+        with open(os.path.join(folder, "ids.txt"), "rb") as f:
+            ids = f.read(meta["ids_bytes"]).decode("utf-8").splitlines()
+        if rows == 0:
+            return meta, ids, np.empty((0, dimension), dtype=numpy_dtype)
+        path = os.path.join(folder, _VECTOR_FILES[meta["dtype"]])
+        return meta, ids, np.memmap(path, dtype=numpy_dtype, mode="r", shape=(rows, dimension))
+
+    def write(self, project_name: str, embeddings: List[Tuple[str, np.ndarray]]):
+        """Replace a project's store with these (chunk_id, embedding) pairs."""
+        with self._locked():
+            shutil.rmtree(self._folder(project_name), ignore_errors=True)
+            self._append(project_name, embeddings)
+
+    def append(self, project_name: str, embeddings: List[Tuple[str, np.ndarray]]):
+        """Add (chunk_id, embedding) pairs of freshly inserted chunks."""
+        with self._locked():
+            self._append(project_name, embeddings)
+
+    def _append(self, project_name: str, embeddings: List[Tuple[str, np.ndarray]]):
+        if not embeddings:
+            return
+        vectors = normalize_rows(np.array([embedding for _, embedding in embeddings], dtype=np.float32))
+        folder = self._folder(project_name)
+        meta = self._read_meta(folder)
+        if meta is None:
+            os.makedirs(folder, exist_ok=True)
+            meta = self._new_meta(project_name, vectors.shape[1], self.dtype)
+        elif meta["dimension"] != vectors.shape[1]:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({meta['dimension']})")
+        meta.setdefault("dtype", "float32")
+        meta.setdefault("scale", 1.0)
+        rows = encode_rows(vectors, meta["dtype"])  # The project's own dtype, until it is written again
+        self._append_rows(folder, meta, [chunk_id for chunk_id, _ in embeddings], rows)
+
+    def _new_meta(self, project_name: str, dimension: int, dtype: str) -> dict:
+        return {
+            "project_name": project_name, "dimension": int(dimension), "dtype": dtype,
+            "scale": ROW_FORMATS[dtype][1], "rows": 0, "ids_bytes": 0
+        }
+
+    def _append_rows(self, folder: str, meta: dict, ids: List[str], rows: np.ndarray):
+        """Write rows (in the store's dtype) after the committed part of the files, dropping what an interrupted append left, then commit them."""
+        ids_data = "".join(f"{chunk_id}\n" for chunk_id in ids).encode("utf-8")
+        for name, offset, data in (
+            (_VECTOR_FILES[meta["dtype"]], meta["rows"] * meta["dimension"] * rows.itemsize, rows.tobytes()),
+            ("ids.txt", meta["ids_bytes"], ids_data),
+        ):
+            with open(os.path.join(folder, name), "ab") as f:
+                f.truncate(offset)
+                f.write(data)
+
+        meta["rows"] += len(rows)
+        meta["ids_bytes"] += len(ids_data)
+        self._write_meta(folder, meta)
+
+    def remove(self, project_name: str, chunk_ids: List[str]):
+        """Remove chunks, writing the project's store again without them."""
+        # Locked from reading the rows to the swap, so a concurrent append can't be lost
+        with self._locked():
+            loaded = self._load(project_name)
+            if loaded is None:
+                return
+            meta, ids, rows = loaded
+            removed = set(chunk_ids)
+            keep = np.array([chunk_id not in removed for chunk_id in ids], dtype=bool)
+            if keep.all():
+                return
+
+            kept_ids = [chunk_id for chunk_id, kept in zip(ids, keep) if kept]
+            kept_rows = np.array(rows[keep])  # Copied as stored, no decoding and encoding again
+            del loaded, rows  # Release the mapping before the folder is replaced
+
+            # Build the new store next to the old one and swap the folders. If that is interrupted the
+            # project has no store and it is rebuilt from the database.
+            folder = self._folder(project_name)
+            new_folder, old_folder = folder + ".new", folder + ".old"
+            for leftover in (new_folder, old_folder):
+                shutil.rmtree(leftover, ignore_errors=True)
+            os.makedirs(new_folder)
+            self._append_rows(new_folder, self._new_meta(project_name, meta["dimension"], meta["dtype"]), kept_ids, kept_rows)
+            os.replace(folder, old_folder)
+            os.replace(new_folder, folder)
+            shutil.rmtree(old_folder, ignore_errors=True)
+        logger.info(f"Removed {len(ids) - len(kept_ids)} vectors from the store of project '{project_name}'")
+
+    def drop_project(self, project_name: str):
+        with self._locked():
+            shutil.rmtree(self._folder(project_name), ignore_errors=True)
+
+    def clear(self):
+        with self._locked():
+            for name in os.listdir(self.root):
+                if name != ".lock":  # Other processes may be waiting on it
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
@@ -0,0 +1,112 @@
+import io
+import os
+import shutil
+import logging
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, List
+from werkzeug.utils import secure_filename
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink for ZipFile. The written bytes are taken out with drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _pieces(buffer: _StreamBuffer) -> Iterator[bytes]:
+    data = buffer.drain()
+    if data:
+        yield data
+
+
+def stream_zip(store, file_names: List[str], workers: int = None, spool_size: int = None, chunk_size: int = 1024 * 1024,
+               cache=None, hashes: Dict[str, str] = None) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of the given files of a blob store, piece by piece.
+
+    Up to `workers` blobs are downloaded at once (two per worker are queued) into temporary files
+    that stay in memory up to `spool_size` bytes. Entries are written in the order the downloads
+    finish and every piece is yielded as soon as it is written, so the response starts with the
+    first finished file and memory stays bounded. Entries use ZIP64, archives over 4 GB are fine.
+    Files that fail to download are listed in a "missing_files.txt" entry at the end.
+
+    With a BlobCache and the content hashes of the files ({file_name: file_hash}), cached files are
+    read from disk and the others are downloaded into the cache instead of a temporary file.
+
+    Settings default to the ZIP_WORKERS and ZIP_SPOOL_MB environment variables.
+    """
+    workers = workers or int(os.getenv("ZIP_WORKERS", "4"))
+    spool_size = spool_size or int(os.getenv("ZIP_SPOOL_MB", "16")) * 1024 * 1024
+
+    def fetch(file_name):
+        blob_name = secure_filename(file_name)  # Blob names are the sanitized file names
+        file_hash = (hashes or {}).get(file_name)
+        if cache is not None and file_hash:
+            extension = os.path.splitext(blob_name)[1]
+            path = cache.get(file_hash, extension)
+            if path is None:
+                _, path = cache.put_with(lambda f: store.download_to(blob_name, f), extension)
+            return open(path, "rb")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        try:
+            store.download_to(blob_name, spool)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+    buffer = _StreamBuffer()
+    missing = []
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zip-fetch")
+    try:
+        with zipfile.ZipFile(buffer, "w") as zf:
+            names = iter(file_names)
+            in_flight = {}
+            while True:
+                for file_name in names:
+                    in_flight[pool.submit(fetch, file_name)] = file_name
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_name = in_flight.pop(future)
+                    try:
+                        spool = future.result()
+                    except Exception as e:
+                        logger.error(f"Could not download '{file_name}' for the ZIP: {e}")
+                        missing.append(file_name)
+                        continue
+                    with spool, zf.open(file_name, "w", force_zip64=True) as entry:  # Keep the original name inside the ZIP
+                        for block in iter(lambda: spool.read(chunk_size), b""):
+                            entry.write(block)
+                            yield from _pieces(buffer)
+                    yield from _pieces(buffer)
+
+            if missing:
+                zf.writestr("missing_files.txt", "\n".join(missing))
+        yield from _pieces(buffer)  # Central directory
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -42,11 +42,38 @@ export const getSynonyms = async (keywordsList) => {
   return await response.json();
 };
 
-export const processFiles = async () => {
-  const response = await axios.post(`${API_BASE_URL}/process-files`);
+export const getJobStatus = async (jobId) => {
+  const response = await axios.get(`${API_BASE_URL}/jobs/${jobId}`);
+  return response.data;
+};
+
+export const cancelJob = async (jobId) => {
+  const response = await axios.post(`${API_BASE_URL}/jobs/${jobId}/cancel`);
   return response.data;
 };
 
+// Processing runs as a background job on the server, poll it until it has finished
+export const processFiles = async (onProgress, interval = 1000) => {
+  const response = await axios.post(`${API_BASE_URL}/process-files`);
+  const { job_id } = response.data;
+
+  while (true) {
+    const status = await getJobStatus(job_id);
+    if (onProgress) onProgress(status);
+
+    if (status.state === "done") {
+      return { ...status, message: "Bestanden verwerkt!" };
+    }
+    if (status.state === "failed") {
+      throw new Error(status.error || "Verwerken van de bestanden is mislukt.");
+    }
+    if (status.state === "cancelled") {
+      throw new Error("Verwerken van de bestanden is geannuleerd.");
+    }
+    await new Promise((resolve) => setTimeout(resolve, interval));
+  }
+};
+
 export const fetchFiles = async () => {
   const response = await axios.get(`${API_BASE_URL}/uploaded_files`);
   return response.data; // Return the response data